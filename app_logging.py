@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+日志模块
+所有日志先进入内存环形缓冲区（「工具 > 诊断」窗口查看最近的记录），
+开启文件日志时再经队列交给后台线程写入滚动日志文件，工作线程不做同步文件 I/O。
+
+热点路径的用法:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("...", extra=hdc_fields(...))
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from collections import deque
+
+LOGGER_NAME = "hdc_udid_tool"
+
+# 环形缓冲区保留的记录数
+RING_SIZE = 500
+
+# 滚动日志：单个文件大小与保留份数
+LOG_FILE_BYTES = 1024 * 1024
+LOG_FILE_COUNT = 3
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(threadName)s %(message)s"
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+class RingBufferHandler(logging.Handler):
+    """把最近的日志记录保存在内存中，超出容量时丢弃最早的记录"""
+
+    def __init__(self, capacity=RING_SIZE):
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        # deque.append 是线程安全的，无需格式化，查看时再格式化
+        self.records.append(record)
+
+    def snapshot(self, level=logging.DEBUG):
+        """返回不低于 level 的记录列表（按时间先后）"""
+        return [record for record in list(self.records) if record.levelno >= level]
+
+    def clear(self):
+        self.records.clear()
+
+
+ring_buffer = RingBufferHandler()
+logger.addHandler(ring_buffer)
+logger.setLevel(logging.DEBUG)
+logger.propagate = False
+
+_listener = None
+_lock = threading.Lock()
+
+
+def hdc_fields(command, returncode=None, duration=None, stdout=None, stderr=None):
+    """hdc 调用的结构化字段，通过 extra= 附加到日志记录上"""
+    return {
+        "hdc_command": " ".join(command),
+        "hdc_returncode": returncode,
+        "hdc_duration": duration,
+        "hdc_stdout": stdout,
+        "hdc_stderr": stderr,
+    }
+
+
+def format_record(record):
+    """格式化一条记录，hdc 调用附带输出内容"""
+    text = logging.Formatter(LOG_FORMAT).format(record)
+    stdout = getattr(record, "hdc_stdout", None)
+    stderr = getattr(record, "hdc_stderr", None)
+    if stdout:
+        text += "\n    stdout: " + stdout.strip().replace("\n", "\n            ")
+    if stderr:
+        text += "\n    stderr: " + stderr.strip().replace("\n", "\n            ")
+    return text
+
+
+def setup_logging(log_dir=None, file_level=logging.INFO, enabled=True):
+    """配置日志：enabled 为 False 时关闭全部日志；log_dir 不为空时异步写入滚动日志文件"""
+    global _listener
+    if not enabled:
+        logger.setLevel(logging.CRITICAL + 1)
+        return
+    logger.setLevel(logging.DEBUG)
+    if not log_dir:
+        return
+
+    with _lock:
+        if _listener is not None:
+            return
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, f"{LOGGER_NAME}.log"),
+            maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_COUNT, encoding="utf-8")
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.setLevel(file_level)
+        logger.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台写入线程，写完队列中剩余的记录"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
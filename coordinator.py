@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+多实例协调模块
+同一台主机上同时打开多个本工具时，通过文件锁选出一个主实例：只有主实例访问 hdc 查询设备列表和 UDID，
+并把结果写入共享快照文件（先写临时文件再原子替换）；其他实例只读取快照。
+主实例退出后操作系统释放文件锁，其他实例在下一次轮询时接管，hdc 负载与打开的实例数无关。
+
+默认使用当前用户的数据目录，只协调同一账户的实例。不同账户共用一个 hdc 服务时可显式指定共享目录：
+共享目录必须设置粘滞位（其他用户不能删除或替换本用户的文件），快照和刷新请求按用户分文件写入，
+所有文件以 O_NOFOLLOW 打开并检查类型和所有者，不通过路径修改权限。
+共享目录中的任何用户都能发布快照，只应与信任的账户共用。
+"""
+
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from app_logging import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_FILE = "leader.lock"
+# 快照和刷新请求按用户区分：<前缀>-<用户>.<扩展名>，文件所有者必须与文件名中的用户一致
+SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX = "devices_snapshot-", ".json"
+REQUEST_PREFIX, REQUEST_SUFFIX = "refresh-", ".request"
+
+# 轮询间隔（秒）：从实例检查快照更新和尝试接管，主实例发布快照和检查刷新请求
+POLL_INTERVAL = 0.5
+
+SNAPSHOT_FORMAT = 1
+
+# 共享目录：所有用户可写并设置粘滞位；共享模式下文件对其他用户只读
+SHARED_DIR_MODE = 0o1777
+SHARED_FILE_MODE = 0o644
+PRIVATE_DIR_MODE = 0o700
+PRIVATE_FILE_MODE = 0o600
+
+O_NOFOLLOW = getattr(os, "O_NOFOLLOW", 0)
+O_DIRECTORY = getattr(os, "O_DIRECTORY", 0)
+O_BINARY = getattr(os, "O_BINARY", 0)
+
+
+def current_user():
+    """文件名中使用的用户标识：POSIX 为 uid，Windows 为用户名"""
+    if hasattr(os, "getuid"):
+        return str(os.getuid())
+    import getpass
+    return getpass.getuser()
+
+
+def owned_by(info, user):
+    """文件是否属于 user；Windows 上 st_uid 无意义，不做检查"""
+    return not hasattr(os, "getuid") or str(info.st_uid) == user
+
+
+def _fchmod(fd, mode):
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, mode)
+
+
+def open_checked(path, flags, mode=PRIVATE_FILE_MODE, owner=None):
+    """以 O_NOFOLLOW 打开普通文件；不是普通文件或（指定 owner 时）所有者不符时抛出 OSError"""
+    fd = os.open(path, flags | O_NOFOLLOW | O_BINARY, mode)
+    try:
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode):
+            raise OSError(f"不是普通文件: {path}")
+        if owner is not None and not owned_by(info, owner):
+            raise OSError(f"文件所有者不符: {path}")
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def prepare_dir(path, shared):
+    """创建或检查协调目录：不能是符号链接；其他用户可写时必须设置粘滞位；私有目录必须属于当前用户"""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    try:
+        os.mkdir(path, PRIVATE_DIR_MODE)
+        created = True
+    except FileExistsError:
+        created = False
+    if created and shared and hasattr(os, "fchmod"):
+        fd = os.open(path, os.O_RDONLY | O_DIRECTORY | O_NOFOLLOW)
+        try:
+            os.fchmod(fd, SHARED_DIR_MODE)
+        finally:
+            os.close(fd)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise OSError(f"协调目录不是目录（或是符号链接）: {path}")
+    if hasattr(os, "getuid"):
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not info.st_mode & stat.S_ISVTX:
+            raise OSError(f"协调目录对其他用户可写但未设置粘滞位: {path}")
+        if not shared and not owned_by(info, current_user()):
+            raise OSError(f"协调目录不属于当前用户: {path}")
+
+
+class FileLock:
+    """非阻塞的独占文件锁，进程退出（包括崩溃）时由操作系统释放
+
+    锁文件由第一个实例创建；其他用户的实例只读打开同一文件加锁，不会改动文件内容和权限。
+    """
+
+    def __init__(self, path, file_mode=PRIVATE_FILE_MODE):
+        self.path = path
+        self.file_mode = file_mode
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def _open(self):
+        try:
+            fd = open_checked(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, self.file_mode)
+        except FileExistsError:
+            return open_checked(self.path, os.O_RDONLY)
+        _fchmod(fd, self.file_mode)
+        return fd
+
+    def try_acquire(self):
+        if self._fd is not None:
+            return True
+        fd = self._open()
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        os.close(self._fd)
+        self._fd = None
+
+
+def write_snapshot(path, snapshot, file_mode=PRIVATE_FILE_MODE):
+    """原子写入快照：读取方要么看到旧文件，要么看到完整的新文件"""
+    directory = os.path.dirname(path) or "."
+    # mkstemp 以 O_EXCL 创建，不会跟随他人预先放置的符号链接
+    fd, temp_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".tmp", dir=directory)
+    try:
+        _fchmod(fd, file_mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            json.dump(snapshot, temp_file, ensure_ascii=False)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_snapshot(path, owner=None):
+    """读取快照，文件不存在、不是普通文件、所有者不符或格式不对时返回 None"""
+    try:
+        fd = open_checked(path, os.O_RDONLY, owner=owner)
+        with os.fdopen(fd, encoding="utf-8") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return snapshot
+
+
+def _user_files(directory, prefix, suffix):
+    """目录中按用户区分的文件 [(路径, 用户, mtime_ns)]，只包含所有者与文件名一致的普通文件"""
+    files = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return files
+    for name in names:
+        if not (name.startswith(prefix) and name.endswith(suffix)):
+            continue
+        path = os.path.join(directory, name)
+        user = name[len(prefix):-len(suffix)]
+        try:
+            info = os.lstat(path)
+        except OSError:
+            continue
+        if stat.S_ISREG(info.st_mode) and owned_by(info, user):
+            files.append((path, user, info.st_mtime_ns))
+    return files
+
+
+class InstanceCoordinator:
+    """主实例选举与快照共享
+
+    回调均在协调线程中调用：
+      build_snapshot() -> dict       主实例发布快照时获取当前设备状态
+      on_snapshot(snapshot)          从实例读到新快照
+      on_refresh_request()           主实例收到从实例的刷新请求
+      on_role_change(is_leader)      本实例成为主实例
+    """
+
+    def __init__(self, directory, build_snapshot, on_snapshot, on_refresh_request=None, on_role_change=None,
+                 poll_interval=POLL_INTERVAL, shared=False):
+        """directory 默认是当前用户的数据目录；shared=True 表示与其他账户共用的目录（需显式指定）"""
+        prepare_dir(directory, shared)
+        self.directory = directory
+        self.file_mode = SHARED_FILE_MODE if shared else PRIVATE_FILE_MODE
+        user = current_user()
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_PREFIX + user + SNAPSHOT_SUFFIX)
+        self.request_path = os.path.join(directory, REQUEST_PREFIX + user + REQUEST_SUFFIX)
+        self.build_snapshot = build_snapshot
+        self.on_snapshot = on_snapshot
+        self.on_refresh_request = on_refresh_request
+        self.on_role_change = on_role_change
+        self.poll_interval = poll_interval
+        self._lock = FileLock(os.path.join(directory, LOCK_FILE), self.file_mode)
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._snapshot_seen = None
+        self._requests_seen = self._requests()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        return self._lock.held
+
+    def start(self):
+        """尝试成为主实例并启动协调线程，返回是否为主实例"""
+        if self._lock.try_acquire():
+            self._dirty.set()
+        self._thread = threading.Thread(target=self._loop, name="instance-coordinator", daemon=True)
+        self._thread.start()
+        return self.is_leader
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval * 2)
+        self._lock.release()
+
+    def mark_dirty(self):
+        """设备状态有变化，主实例在下一次轮询时发布快照"""
+        self._dirty.set()
+
+    def latest_snapshot(self):
+        """最近发布的快照文件 (路径, 用户, mtime_ns)；主实例换成其他用户后以新文件为准"""
+        files = _user_files(self.directory, SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX)
+        return max(files, key=lambda item: item[2]) if files else None
+
+    def read(self):
+        latest = self.latest_snapshot()
+        return read_snapshot(latest[0], owner=latest[1]) if latest else None
+
+    def request_refresh(self):
+        """从实例请求主实例重新查询设备（写入本用户的请求文件）"""
+        try:
+            fd = open_checked(self.request_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, self.file_mode,
+                              owner=current_user())
+            with os.fdopen(fd, "w", encoding="utf-8") as request_file:
+                request_file.write(f"{os.getpid()} {time.time()}\n")
+        except OSError as e:
+            logger.warning("Error requesting refresh from leader: %s", e)
+
+    def _requests(self):
+        return {path: mtime for path, _, mtime in _user_files(self.directory, REQUEST_PREFIX, REQUEST_SUFFIX)}
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.is_leader:
+                    self._lead()
+                elif self._lock.try_acquire():
+                    logger.info("Became leader instance (pid %d)", os.getpid())
+                    # 接管时本身就会刷新，之前的刷新请求不再处理
+                    self._requests_seen = self._requests()
+                    self._dirty.set()
+                    if self.on_role_change is not None:
+                        self.on_role_change(True)
+                else:
+                    self._follow()
+            except Exception as e:
+                logger.error("Instance coordination error: %s", e)
+
+    def _lead(self):
+        requests = self._requests()
+        if any(self._requests_seen.get(path) != mtime for path, mtime in requests.items()):
+            if self.on_refresh_request is not None:
+                self.on_refresh_request()
+        self._requests_seen = requests
+        if self._dirty.is_set():
+            self._dirty.clear()
+            snapshot = dict(self.build_snapshot(), format=SNAPSHOT_FORMAT, leader_pid=os.getpid(),
+                            updated=time.time())
+            try:
+                write_snapshot(self.snapshot_path, snapshot, self.file_mode)
+            except OSError as e:
+                # Windows 上读取方恰好打开文件时替换会失败，下次轮询重试
+                self._dirty.set()
+                logger.warning("Error publishing device snapshot: %s", e)
+
+    def _follow(self):
+        latest = self.latest_snapshot()
+        if latest is None or (latest[0], latest[2]) == self._snapshot_seen:
+            return
+        snapshot = read_snapshot(latest[0], owner=latest[1])
+        if snapshot is not None:
+            self._snapshot_seen = (latest[0], latest[2])
+            self.on_snapshot(snapshot)
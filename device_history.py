@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+设备历史记录模块
+在本地 SQLite 数据库中记录每台设备的序列号、UDID、型号及首次/最近出现时间，
+序列号与 UDID 均建有索引，支持按前缀即时检索。
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from app_logging import logger
+
+# 单次检索返回的最大条数，保证界面刷新足够快
+SEARCH_LIMIT = 200
+
+# 前缀匹配超过这么多条时改为沿 last_seen 索引倒序扫描并过滤，避免对大量匹配结果排序
+DENSE_MATCHES = 2000
+
+# 批量写入：攒够这么多条或等待超过这么久就提交一次
+BATCH_SIZE = 100
+BATCH_INTERVAL = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS device_history (
+    serial     TEXT NOT NULL COLLATE NOCASE,
+    udid       TEXT NOT NULL COLLATE NOCASE,
+    model      TEXT,
+    first_seen REAL NOT NULL,
+    last_seen  REAL NOT NULL,
+    UNIQUE (serial, udid)
+);
+CREATE INDEX IF NOT EXISTS idx_history_serial ON device_history (serial);
+CREATE INDEX IF NOT EXISTS idx_history_udid ON device_history (udid);
+CREATE INDEX IF NOT EXISTS idx_history_last_seen ON device_history (last_seen);
+"""
+
+_UPSERT = """
+INSERT INTO device_history (serial, udid, model, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (serial, udid) DO UPDATE SET
+    last_seen = MAX(last_seen, excluded.last_seen),
+    first_seen = MIN(first_seen, excluded.first_seen),
+    model = COALESCE(excluded.model, model)
+"""
+
+_COLUMNS = "serial, udid, model, first_seen, last_seen"
+
+_STOP = object()
+
+
+def _prefix_upper_bound(prefix):
+    """前缀区间查询的上界，使 serial >= prefix AND serial < bound 能走索引"""
+    return prefix + "\U0010ffff"
+
+
+def _count_prefix(conn, column, text, upper):
+    """统计前缀匹配条数，最多数到 DENSE_MATCHES"""
+    return conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM device_history WHERE {column} >= ? AND {column} < ? LIMIT ?)",
+        (text, upper, DENSE_MATCHES)).fetchone()[0]
+
+
+def _search(conn, text, limit):
+    text = (text or "").strip()
+    if not text:
+        cursor = conn.execute(
+            f"SELECT {_COLUMNS} FROM device_history ORDER BY last_seen DESC LIMIT ?", (limit,))
+        return cursor.fetchall()
+
+    upper = _prefix_upper_bound(text)
+    params = (text, upper, text, upper, limit)
+    if _count_prefix(conn, "serial", text, upper) + _count_prefix(conn, "udid", text, upper) < DENSE_MATCHES:
+        # 匹配较少：分别走序列号、UDID 索引取出全部匹配，再按时间排序
+        cursor = conn.execute(
+            f"""
+            SELECT {_COLUMNS} FROM (
+                SELECT {_COLUMNS} FROM device_history WHERE serial >= ? AND serial < ?
+                UNION
+                SELECT {_COLUMNS} FROM device_history WHERE udid >= ? AND udid < ?
+            ) ORDER BY last_seen DESC LIMIT ?
+            """,
+            params)
+    else:
+        # 匹配很多（如只输入一两个字符）：沿 last_seen 索引倒序扫描，凑够 limit 条即停止，无需排序
+        cursor = conn.execute(
+            f"""
+            SELECT {_COLUMNS} FROM device_history INDEXED BY idx_history_last_seen
+            WHERE (serial >= ? AND serial < ?) OR (udid >= ? AND udid < ?)
+            ORDER BY last_seen DESC LIMIT ?
+            """,
+            params)
+    return cursor.fetchall()
+
+
+class DeviceHistory:
+    """设备历史存储：写入在后台线程中批量提交，检索在调用线程中直接走索引"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # 读连接属于创建者线程（UI 线程），WAL 模式下不会被后台写入阻塞
+        self._read_conn = sqlite3.connect(db_path)
+        self._read_conn.execute("PRAGMA journal_mode=WAL")
+        self._read_conn.executescript(_SCHEMA)
+        self._read_conn.commit()
+
+        self._search_cond = threading.Condition()
+        self._search_request = None
+        self._searcher = None
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="device-history-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, serial, udid, model=None, seen_at=None):
+        """记录一次设备出现，可在任意线程调用，不阻塞"""
+        if not serial or not udid:
+            return
+        self._queue.put((serial, udid, model or None, seen_at or time.time()))
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """按序列号或 UDID 前缀检索，结果按最近出现时间倒序；空字符串返回最近记录"""
+        return _search(self._read_conn, text, limit)
+
+    def search_async(self, text, callback, limit=SEARCH_LIMIT):
+        """在后台检索线程中执行 search，结果通过 callback(text, rows) 在检索线程中返回。
+        连续输入时只执行最新的一次请求，之前尚未开始的请求直接丢弃"""
+        with self._search_cond:
+            if self._searcher is None:
+                self._searcher = threading.Thread(target=self._search_loop, name="device-history-search",
+                                                  daemon=True)
+                self._searcher.start()
+            self._search_request = (text, callback, limit)
+            self._search_cond.notify()
+
+    def count(self):
+        return self._read_conn.execute("SELECT COUNT(*) FROM device_history").fetchone()[0]
+
+    def close(self, timeout=2.0):
+        """提交剩余的待写记录并关闭数据库"""
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        with self._search_cond:
+            self._search_request = _STOP
+            self._search_cond.notify()
+        self._read_conn.close()
+
+    def _search_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            while True:
+                with self._search_cond:
+                    while self._search_request is None:
+                        self._search_cond.wait()
+                    request, self._search_request = self._search_request, None
+                if request is _STOP:
+                    return
+                text, callback, limit = request
+                try:
+                    rows = _search(conn, text, limit)
+                except sqlite3.Error as e:
+                    logger.error("Error searching device history: %s", e)
+                    rows = []
+                callback(text, rows)
+        finally:
+            conn.close()
+
+    def _writer_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                stop = False
+                deadline = time.monotonic() + BATCH_INTERVAL
+                while len(batch) < BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._write_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        rows = [(serial, udid, model, seen_at, seen_at) for serial, udid, model, seen_at in batch]
+        try:
+            with conn:
+                conn.executemany(_UPSERT, rows)
+        except sqlite3.Error as e:
+            logger.error("Error writing device history: %s", e)
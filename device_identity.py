@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+设备身份模块
+同一台设备可能以多个序列号出现在 `hdc list targets` 中（例如 USB 与 TCP 同时连接，或重连后换了连接标识）。
+序列号与 UDID 的对应关系保存在 DeviceRegistry 中；本模块据此把多个连接归并为一台设备，
+并统计每个连接上短查询命令的耗时，后续命令走耗时最短的连接。
+"""
+
+from device_registry import is_network_serial
+
+# 连接耗时的指数平滑系数
+LATENCY_ALPHA = 0.3
+
+# 只用耗时稳定的短查询衡量连接快慢；安装、文件传输等命令的耗时取决于负载而不是连接
+LATENCY_PROBES = (["shell", "bm", "get"], ["shell", "param", "get"])
+
+
+class DeviceIdentities:
+    """基于 DeviceRegistry 的设备归并与路由"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def record_latency(self, command, duration, timed_out=False):
+        """根据 `-t <序列号> shell bm get/param get` 的耗时更新该连接的平均耗时；超时的调用不计入"""
+        if timed_out or len(command) < 5 or command[0] != "-t" or command[2:5] not in LATENCY_PROBES:
+            return
+        record = self.registry.get(command[1])
+        if record is None:
+            return
+        previous = record.latency
+        latency = duration if previous is None else previous * (1 - LATENCY_ALPHA) + duration * LATENCY_ALPHA
+        self.registry.set_latency(record.serial, latency)
+
+    def same_device(self, serial, other):
+        udid = self.registry.udid_for(serial)
+        return udid is not None and udid == self.registry.udid_for(other)
+
+    def route(self, serial):
+        """返回同一设备在线连接中耗时最短的序列号；未知设备原样返回"""
+        udid = self.registry.udid_for(serial)
+        if udid is None:
+            return serial
+        return self._fastest([serial] + self.registry.serials_for_udid(udid))
+
+    def group(self, serials):
+        """把序列号按设备分组，返回 [(首选序列号, [其他序列号...])]，保持列表原有顺序"""
+        groups = []
+        by_udid = {}
+        for serial in serials:
+            udid = self.registry.udid_for(serial)
+            if udid is None:
+                groups.append([serial])
+            elif udid in by_udid:
+                by_udid[udid].append(serial)
+            else:
+                by_udid[udid] = [serial]
+                groups.append(by_udid[udid])
+        result = []
+        for members in groups:
+            primary = self._fastest(members)
+            result.append((primary, [serial for serial in members if serial != primary]))
+        return result
+
+    def _fastest(self, serials):
+        def sort_key(serial):
+            record = self.registry.get(serial)
+            latency = record.latency if record is not None and record.latency is not None else float("inf")
+            # 未测过耗时的连接排在后面；耗时相同时优先 USB
+            return latency, is_network_serial(serial)
+        return min(dict.fromkeys(serials), key=sort_key)
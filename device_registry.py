@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+设备注册表模块
+设备状态统一保存在 DeviceRegistry 中，按序列号和 UDID 建立索引，查询均为 O(1)；
+每次变更递增版本号并通知订阅者，界面和工作线程都从这里读取，而不是解析控件中的文本。
+"""
+
+import threading
+import time
+
+# 设备状态
+PENDING = "pending"        # 已连接，尚未获取 UDID
+RESOLVING = "resolving"    # 正在获取 UDID
+RESOLVED = "resolved"      # 已获取 UDID
+FAILED = "failed"          # 获取失败，error 中为原因
+
+
+class DeviceRecord:
+    """一个连接（序列号）的状态"""
+
+    __slots__ = ("serial", "state", "udid", "model", "error", "online",
+                 "first_seen", "last_seen", "resolved_at", "latency")
+
+    def __init__(self, serial, now):
+        self.serial = serial
+        self.state = PENDING
+        self.udid = None
+        self.model = None
+        self.error = None
+        self.online = True
+        self.first_seen = now
+        self.last_seen = now
+        self.resolved_at = None
+        self.latency = None  # 平滑后的命令耗时（秒）
+
+    def __repr__(self):
+        return f"DeviceRecord({self.serial!r}, {self.state}, udid={self.udid!r}, online={self.online})"
+
+
+def is_network_serial(serial):
+    """TCP 连接的序列号形如 ip:port"""
+    return ":" in serial
+
+
+class DeviceRegistry:
+    """线程安全的设备注册表
+
+    订阅者 callback(version, serials) 在发生变更的线程中调用，serials 为本次变更涉及的序列号集合；
+    需要操作界面的订阅者应自行切换到 UI 线程。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_serial = {}
+        self._by_udid = {}      # UDID -> {序列号}
+        self._online = []       # 最近一次设备列表（保持 hdc 返回的顺序）
+        self._subscribers = []
+        self.version = 0
+
+    # --- 查询 ---
+
+    def get(self, serial):
+        with self._lock:
+            return self._by_serial.get(serial)
+
+    def udid_for(self, serial):
+        with self._lock:
+            record = self._by_serial.get(serial)
+            return record.udid if record is not None else None
+
+    def serials_for_udid(self, udid, online_only=True):
+        with self._lock:
+            serials = self._by_udid.get(udid, ())
+            return [serial for serial in serials
+                    if not online_only or self._by_serial[serial].online]
+
+    def online_serials(self):
+        with self._lock:
+            return list(self._online)
+
+    def resolved(self):
+        """所有已获取 UDID 的记录"""
+        with self._lock:
+            return [record for record in self._by_serial.values() if record.state == RESOLVED]
+
+    def failed(self):
+        """所有获取 UDID 失败的记录"""
+        with self._lock:
+            return [record for record in self._by_serial.values() if record.state == FAILED]
+
+    # --- 变更 ---
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def set_online(self, serials):
+        """更新在线设备；网络连接离线后地址可能被其他设备复用，因此直接删除其记录"""
+        now = time.time()
+        with self._lock:
+            online = set(serials)
+            changed = set()
+            for serial in serials:
+                record = self._by_serial.get(serial)
+                if record is None:
+                    self._by_serial[serial] = DeviceRecord(serial, now)
+                    changed.add(serial)
+                else:
+                    if not record.online:
+                        record.online = True
+                        changed.add(serial)
+                    record.last_seen = now
+            for serial, record in list(self._by_serial.items()):
+                if serial in online or not record.online:
+                    continue
+                changed.add(serial)
+                if is_network_serial(serial):
+                    self._remove(record)
+                else:
+                    record.online = False
+            self._online = list(dict.fromkeys(serials))
+            version = self._bump()
+        self._notify(version, changed)
+
+    def set_resolving(self, serial):
+        self._update(serial, state=RESOLVING, error=None)
+
+    def set_failed(self, serial, error):
+        self._update(serial, state=FAILED, error=error)
+
+    def set_udid(self, serial, udid):
+        """记录 UDID，返回同一 UDID 下其他在线序列号（即这台设备的其他连接）"""
+        with self._lock:
+            record = self._record(serial)
+            if record.udid is not None and record.udid != udid:
+                self._by_udid.get(record.udid, set()).discard(serial)
+            record.udid = udid
+            record.state = RESOLVED
+            record.error = None
+            record.resolved_at = time.time()
+            self._by_udid.setdefault(udid, set()).add(serial)
+            aliases = [other for other in self._by_udid[udid]
+                       if other != serial and self._by_serial[other].online]
+            version = self._bump()
+        self._notify(version, {serial})
+        return aliases
+
+    def set_model(self, serial, model):
+        self._update(serial, model=model)
+
+    def set_latency(self, serial, latency):
+        # 耗时只影响路由，不通知订阅者
+        with self._lock:
+            record = self._by_serial.get(serial)
+            if record is not None:
+                record.latency = latency
+
+    # --- 内部 ---
+
+    def _record(self, serial):
+        record = self._by_serial.get(serial)
+        if record is None:
+            record = self._by_serial[serial] = DeviceRecord(serial, time.time())
+        return record
+
+    def _update(self, serial, **fields):
+        with self._lock:
+            record = self._record(serial)
+            for name, value in fields.items():
+                setattr(record, name, value)
+            version = self._bump()
+        self._notify(version, {serial})
+
+    def _remove(self, record):
+        del self._by_serial[record.serial]
+        if record.udid is not None:
+            serials = self._by_udid.get(record.udid)
+            if serials is not None:
+                serials.discard(record.serial)
+                if not serials:
+                    del self._by_udid[record.udid]
+
+    def _bump(self):
+        self.version += 1
+        return self.version
+
+    def _notify(self, version, serials):
+        if not serials:
+            return
+        for callback in self._subscribers:
+            callback(version, serials)
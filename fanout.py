@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+批量执行模块
+对多台设备并发执行安装 HAP 或 shell 命令：并发数有上限、每台设备单独超时，
+每台设备的进度通过回调实时上报，结束后生成汇总报告。
+设备数不超过并发数时，总耗时约等于最慢的一台设备，而不是所有设备耗时之和。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认并发数与每台设备的超时时间（秒）；默认并发覆盖一整批常见数量的设备，一次执行完成
+DEFAULT_PARALLELISM = 64
+MAX_PARALLELISM = 64
+DEFAULT_TIMEOUT = 180
+
+# 进度状态
+PENDING = "等待中"
+RUNNING = "执行中"
+SUCCEEDED = "成功"
+FAILED = "失败"
+
+
+def install_command(hap_path):
+    def build(serial):
+        return ["-t", serial, "install", hap_path]
+    return build
+
+
+def shell_command(command_line):
+    def build(serial):
+        return ["-t", serial, "shell", command_line]
+    return build
+
+
+def install_succeeded(stdout, stderr):
+    text = (stdout or "").lower()
+    return stdout is not None and "fail" not in text and "error" not in text
+
+
+def shell_succeeded(stdout, stderr):
+    return stdout is not None
+
+
+class DeviceResult:
+    __slots__ = ("serial", "state", "started", "finished", "output")
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.state = PENDING
+        self.started = None
+        self.finished = None
+        self.output = ""
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+
+class FanOut:
+    """run_command(command, timeout) 执行 hdc 命令并返回 (stdout, stderr)，超时或出错时 stdout 为 None；
+    on_progress(DeviceResult) 在工作线程中调用。"""
+
+    def __init__(self, run_command, on_progress=None, parallelism=DEFAULT_PARALLELISM, timeout=DEFAULT_TIMEOUT):
+        self.run_command = run_command
+        self.on_progress = on_progress
+        self.parallelism = max(1, parallelism)
+        self.timeout = timeout
+        self.results = {}
+        self.started = None
+        self.finished = None
+        self._cancelled = threading.Event()
+
+    def run(self, serials, build_command, succeeded=shell_succeeded):
+        """阻塞执行，返回 {序列号: DeviceResult}"""
+        self.results = {serial: DeviceResult(serial) for serial in serials}
+        self.started = time.monotonic()
+        workers = max(1, min(self.parallelism, len(serials)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as pool:
+            for serial in serials:
+                pool.submit(self._run_one, self.results[serial], build_command(serial), succeeded)
+        self.finished = time.monotonic()
+        return self.results
+
+    def cancel(self):
+        """取消尚未开始的设备（已开始的设备继续执行到结束或超时）"""
+        self._cancelled.set()
+
+    def _run_one(self, result, command, succeeded):
+        if self._cancelled.is_set():
+            result.state = FAILED
+            result.output = "已取消"
+            self._notify(result)
+            return
+        result.state = RUNNING
+        result.started = time.monotonic()
+        self._notify(result)
+        try:
+            stdout, stderr = self.run_command(command, self.timeout)
+        except Exception as e:
+            stdout, stderr = None, str(e)
+        result.finished = time.monotonic()
+        result.state = SUCCEEDED if succeeded(stdout, stderr) else FAILED
+        result.output = "\n".join(text for text in (stdout, stderr) if text).strip()
+        self._notify(result)
+
+    def _notify(self, result):
+        if self.on_progress is not None:
+            self.on_progress(result)
+
+    def summary(self):
+        """汇总报告文本"""
+        results = list(self.results.values())
+        succeeded = [result for result in results if result.state == SUCCEEDED]
+        failed = [result for result in results if result.state == FAILED]
+        finished = [result for result in results if result.finished is not None]
+        wall = (self.finished or time.monotonic()) - self.started if self.started else 0
+        lines = [f"共 {len(results)} 台设备：成功 {len(succeeded)}，失败 {len(failed)}，总耗时 {wall:.1f}s"]
+        if finished:
+            slowest = max(finished, key=lambda result: result.duration)
+            total = sum(result.duration for result in finished)
+            lines.append(f"最慢设备 {slowest.serial} {slowest.duration:.1f}s，各设备耗时合计 {total:.1f}s")
+        for result in failed:
+            output = result.output.splitlines()[0] if result.output else "无输出"
+            lines.append(f"  失败 {result.serial}: {output}")
+        return "\n".join(lines)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+hdc 会话录制/回放模块
+录制：把每次 hdc 调用的参数、输出、退出码和耗时逐行写入会话文件（JSON Lines，.gz 结尾时自动压缩）
+回放：按参数匹配录制结果，并按原始耗时（可缩放）返回，无需连接真机即可复现现场行为
+模拟：FakeHdc 按设定的设备数量、延迟和插拔频率生成结果，用于压力测试；
+      也可以生成一个模拟 hdc 可执行文件，每次调用都是真实的子进程，用于浸泡测试
+
+使用方法:
+    python main.py --record session.jsonl.gz
+    python main.py --replay session.jsonl.gz [--replay-speed 2]
+    python hdc_session.py session.jsonl.gz      # 查看会话摘要
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+SESSION_VERSION = 1
+
+
+def _open_session(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_session(path):
+    """读取会话文件，返回 (头信息, 调用记录列表)"""
+    header = {}
+    entries = []
+    with _open_session(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "session" in record:
+                header = record
+            else:
+                entries.append(record)
+    return header, entries
+
+
+class SessionRecorder:
+    """录制 hdc 调用，可在多个工作线程中同时调用"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._file = _open_session(path, "w")
+        self._write({"session": SESSION_VERSION, "created": time.time()})
+
+    def record(self, command, stdout, stderr, returncode, started, duration, timed_out=False):
+        """记录一次调用；started 为 time.monotonic() 时间点，duration 单位为秒"""
+        entry = {
+            "argv": list(command),
+            "stdout": stdout,
+            "stderr": stderr,
+            "code": returncode,
+            "t": round(started - self._started, 4),
+            "dur": round(duration, 4),
+        }
+        if timed_out:
+            entry["timeout"] = True
+        self._write(entry)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+
+class SessionReplayer:
+    """回放 hdc 会话：相同参数的调用按录制顺序依次返回，用完后重复最后一次结果"""
+
+    def __init__(self, path, speed=1.0):
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._by_argv = defaultdict(deque)
+        _, entries = load_session(path)
+        for entry in entries:
+            self._by_argv[tuple(entry["argv"])].append(entry)
+
+    def run(self, command):
+        """返回 (stdout, stderr, returncode)；未录制过的命令视为执行失败，录制时超时的命令 stdout 为 None"""
+        key = tuple(command)
+        with self._lock:
+            recorded = self._by_argv.get(key)
+            if not recorded:
+                return "", f"replay: no recorded result for {' '.join(command)}", 1
+            entry = recorded.popleft() if len(recorded) > 1 else recorded[0]
+
+        if self.speed > 0:
+            time.sleep(entry.get("dur", 0) / self.speed)
+        if entry.get("timeout"):
+            return None, f"Command timed out after {entry.get('dur', 0)} seconds (replayed)", entry.get("code")
+        return entry.get("stdout", ""), entry.get("stderr", ""), entry.get("code", 0)
+
+
+class FakeHdc:
+    """模拟 hdc：接口与 SessionReplayer 相同，可替代真实 hdc 做压力测试
+
+    devices 台设备中每次 list targets 随机在线约 online_ratio 的比例，模拟热插拔；
+    每次调用按 latency 秒（±50% 抖动）模拟耗时。
+    """
+
+    def __init__(self, devices=100, latency=0.05, online_ratio=0.9, seed=None):
+        self.serials = [f"FAKE{index:05d}" for index in range(devices)]
+        self.latency = latency
+        self.online_ratio = online_ratio
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @staticmethod
+    def udid_for(serial):
+        return hashlib.sha256(serial.encode("utf-8")).hexdigest().upper()
+
+    def run(self, command):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * self._random.uniform(0.5, 1.5)
+            online = [serial for serial in self.serials if self._random.random() < self.online_ratio]
+        if delay > 0:
+            time.sleep(delay)
+
+        serial = None
+        if len(command) >= 2 and command[0] == "-t":
+            serial, command = command[1], command[2:]
+        if command == ["list", "targets"]:
+            return "\n".join(online) if online else "[Empty]", "", 0
+        if serial is not None and serial not in self.serials:
+            return "", f"[Fail]Device not found: {serial}", 1
+        if command == ["shell", "bm", "get", "-u"]:
+            return f"udid of current device is :\n{self.udid_for(serial)}", "", 0
+        if command[:3] == ["shell", "param", "get"]:
+            return "FAKE-AL00", "", 0
+        if command and command[0] == "tconn":
+            return "Connect OK", "", 0
+        return "", f"[Fail]Unknown command: {' '.join(command)}", 1
+
+
+def print_session_summary(path):
+    """打印会话摘要：每种命令的调用次数与耗时"""
+    header, entries = load_session(path)
+    stats = defaultdict(list)
+    for entry in entries:
+        argv = entry["argv"]
+        # 按命令类型归类，去掉 -t <序列号>
+        if len(argv) >= 2 and argv[0] == "-t":
+            argv = argv[2:]
+        stats[" ".join(argv)].append(entry.get("dur", 0))
+
+    print(f"会话: {path} (版本 {header.get('session', '?')})，共 {len(entries)} 次调用")
+    for command, durations in sorted(stats.items(), key=lambda item: -sum(item[1])):
+        durations.sort()
+        total = sum(durations)
+        print(f"  {len(durations):5d} 次  总计 {total:8.3f}s  "
+              f"平均 {total / len(durations):.3f}s  最大 {durations[-1]:.3f}s  {command}")
+
+
+def write_fake_hdc_launcher(directory, devices=100, latency=0.05, online_ratio=0.9):
+    """在 directory 中生成模拟 hdc 可执行文件（调用本模块的 --fake-hdc），返回其路径"""
+    script = os.path.abspath(__file__)
+    options = f"--devices {devices} --latency {latency} --online-ratio {online_ratio}"
+    if sys.platform == "win32":
+        path = os.path.join(directory, "hdc.cmd")
+        content = f'@"{sys.executable}" "{script}" --fake-hdc {options} -- %*\r\n'
+    else:
+        path = os.path.join(directory, "hdc")
+        content = f'#!/bin/sh\nexec "{sys.executable}" "{script}" --fake-hdc {options} -- "$@"\n'
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.chmod(path, 0o755)
+    return path
+
+
+def fake_hdc_main(argv):
+    """作为模拟 hdc 可执行文件运行：执行一条命令，输出结果并以对应退出码退出"""
+    parser = argparse.ArgumentParser(prog="fake-hdc")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--online-ratio", type=float, default=0.9)
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    stdout, stderr, returncode = FakeHdc(args.devices, args.latency, args.online_ratio).run(command)
+    if stdout:
+        print(stdout)
+    if stderr:
+        print(stderr, file=sys.stderr)
+    return returncode
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--fake-hdc":
+        sys.exit(fake_hdc_main(sys.argv[2:]))
+    if len(sys.argv) != 2:
+        print("用法: python hdc_session.py <会话文件>")
+        sys.exit(1)
+    print_session_summary(sys.argv[1])
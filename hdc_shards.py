@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+hdc 服务分片模块
+设备很多时，所有 shell 会话都经过同一个 hdc 服务进程，服务本身成为瓶颈。
+分片模式在本机不同端口上运行多个 hdc 服务：设备列表从所有分片合并，带序列号的命令通过
+`-s 127.0.0.1:<端口>` 发往列出该设备的分片；尚未被任何分片列出的设备（例如待 tconn 的网络设备）
+按序列号的稳定哈希分配分片。每个分片有独立的看门狗，并统计调用次数、失败次数和平均耗时。
+设备由第一个打开它的 hdc 服务独占，USB 设备通常全部被最先启动的服务认领，因此分片主要分担网络设备。
+"""
+
+import argparse
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from app_logging import logger
+from hdc_watchdog import HdcWatchdog, is_empty_device_list
+
+DEFAULT_HOST = "127.0.0.1"
+# hdc 默认服务端口；第一个分片使用默认端口，直接运行 hdc 命令行时仍连接到它
+DEFAULT_SERVER_PORT = 8710
+
+START_TIMEOUT = 10
+# 连续失败多少次视为分片不可用，其设备改走排序中的下一个分片
+UNHEALTHY_FAILURES = 3
+# 分片耗时的指数平滑系数
+LATENCY_ALPHA = 0.3
+
+
+def shard_ports(count, base=DEFAULT_SERVER_PORT):
+    return [base + index for index in range(max(1, count))]
+
+
+def command_serial(command):
+    """命令针对的设备：`-t <序列号>`，或 `tconn <地址>` 中的地址；其他命令返回 None"""
+    if len(command) >= 2 and command[0] in ("-t", "tconn"):
+        return command[1]
+    return None
+
+
+def strip_server(command):
+    """去掉分片模式加上的 `-s <地址>`，用于会话录制和连接耗时统计"""
+    if len(command) >= 2 and command[0] == "-s":
+        return command[2:]
+    return command
+
+
+class HdcShard:
+    """一个 hdc 服务实例及其统计"""
+
+    def __init__(self, host, port, runner, on_status=None):
+        self.port = port
+        self.address = f"{host}:{port}"
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.last_error = None
+        self.devices = 0
+        self._lock = threading.Lock()
+        self.watchdog = HdcWatchdog(self.wrap(runner), on_status=on_status)
+
+    @property
+    def healthy(self):
+        return self.consecutive_failures < UNHEALTHY_FAILURES
+
+    def wrap(self, runner):
+        """把 runner 包装为发往本分片的版本"""
+        return lambda command, timeout: runner(["-s", self.address] + command, timeout)
+
+    def observe(self, duration, stdout, stderr):
+        with self._lock:
+            self.calls += 1
+            if stdout is None:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = stderr
+            else:
+                self.consecutive_failures = 0
+                self.latency = duration if self.latency is None else \
+                    self.latency * (1 - LATENCY_ALPHA) + duration * LATENCY_ALPHA
+
+    def stats(self):
+        with self._lock:
+            return {
+                "port": self.port,
+                "healthy": self.healthy,
+                "devices": self.devices,
+                "calls": self.calls,
+                "failures": self.failures,
+                "latency": self.latency,
+                "last_error": self.last_error,
+                "recoveries": self.watchdog.recoveries,
+            }
+
+
+class ShardedHdc:
+    """多个 hdc 服务的路由层，call/stats 接口与 HdcWatchdog 相同
+
+    runner(command, timeout) 执行 hdc 命令并返回 (stdout, stderr)，异常时 stdout 为 None。
+    """
+
+    def __init__(self, runner, ports, host=DEFAULT_HOST, on_status=None):
+        self.runner = runner
+        self.shards = [HdcShard(host, port, runner, on_status) for port in ports]
+        self._owners = {}   # 序列号 -> 列出该设备的分片
+        self._lock = threading.Lock()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def rank(self, serial):
+        """按 (序列号, 端口) 的哈希给分片排序（最高随机权重哈希），分片增减时只有少量设备换分片"""
+        return sorted(self.shards, key=lambda shard: zlib.crc32(f"{serial}@{shard.port}".encode("utf-8")),
+                      reverse=True)
+
+    def owner(self, serial):
+        with self._lock:
+            shard = self._owners.get(serial)
+        if shard is not None and shard.healthy:
+            return shard
+        ranked = self.rank(serial)
+        return next((shard for shard in ranked if shard.healthy), ranked[0])
+
+    def route(self, command):
+        """返回加上所属分片地址的命令，用于不经过看门狗的直接调用"""
+        self.start()
+        serial = command_serial(command)
+        shard = self.owner(serial) if serial is not None else self.shards[0]
+        return ["-s", shard.address] + command
+
+    def start(self):
+        """确保各分片的 hdc 服务都已启动（只执行一次）"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            with ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="hdc-shard-start") as pool:
+                results = list(pool.map(lambda shard: shard.wrap(self.runner)(["start"], START_TIMEOUT),
+                                        self.shards))
+            for shard, (stdout, stderr) in zip(self.shards, results):
+                if stdout is None:
+                    logger.warning("Error starting hdc server on port %d: %s", shard.port, stderr)
+
+    def call(self, command, timeout, runner=None):
+        self.start()
+        if command == ["list", "targets"]:
+            return self._list_targets(timeout)
+        if command in (["kill"], ["start"]):
+            results = [self._call_shard(shard, command, timeout, runner) for shard in self.shards]
+            return results[0]
+        serial = command_serial(command)
+        shard = self.owner(serial) if serial is not None else self.shards[0]
+        return self._call_shard(shard, command, timeout, runner)
+
+    def stats(self):
+        shards = [shard.stats() for shard in self.shards]
+        return {
+            "recoveries": sum(shard["recoveries"] for shard in shards),
+            "shards": shards,
+        }
+
+    def format_stats(self):
+        parts = []
+        for shard in self.stats()["shards"]:
+            latency = f"{shard['latency'] * 1000:.0f}ms" if shard["latency"] is not None else "-"
+            state = "正常" if shard["healthy"] else "异常"
+            parts.append(f"{shard['port']}: {state} {shard['devices']} 台 {shard['calls']} 次 {latency}")
+        return "；".join(parts)
+
+    def _call_shard(self, shard, command, timeout, runner=None):
+        started = time.monotonic()
+        stdout, stderr = shard.watchdog.call(command, timeout, runner=shard.wrap(runner) if runner else None)
+        shard.observe(time.monotonic() - started, stdout, stderr)
+        return stdout, stderr
+
+    def _list_targets(self, timeout):
+        """并发查询所有分片并合并；同一设备被多个分片列出时按哈希排序选定所属分片"""
+        with ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="hdc-shard-list") as pool:
+            results = list(pool.map(lambda shard: self._call_shard(shard, ["list", "targets"], timeout),
+                                    self.shards))
+        listed = {}
+        errors = []
+        for shard, (stdout, stderr) in zip(self.shards, results):
+            if stdout is None:
+                errors.append(stderr)
+                continue
+            if is_empty_device_list(stdout):
+                continue
+            for serial in stdout.splitlines():
+                serial = serial.strip()
+                if serial:
+                    listed.setdefault(serial, []).append(shard)
+
+        owners = {}
+        for serial, candidates in listed.items():
+            owners[serial] = next(shard for shard in self.rank(serial) if shard in candidates)
+        with self._lock:
+            self._owners = owners
+        for shard in self.shards:
+            shard.devices = sum(1 for owner in owners.values() if owner is shard)
+
+        if not listed and len(errors) == len(self.shards):
+            return None, errors[0]
+        return "\n".join(listed) if listed else "[Empty]", ""
+
+
+# --- 基准测试 ---
+
+class FakeShardServers:
+    """模拟多个 hdc 服务：每个服务转发 shell 会话时有一段串行的复用开销。
+    与真实 hdc 一样，设备由第一个打开它的服务独占：usb=True 时最先启动的服务认领全部 USB 设备，
+    否则设备是网络设备，由执行 tconn 的服务认领；发往未认领该设备的服务的命令返回 Device not found。"""
+
+    def __init__(self, fake_hdc, ports, mux_cost=0.005, usb=True):
+        self.fake_hdc = fake_hdc
+        self.mux_cost = mux_cost
+        self.usb = usb
+        self._locks = {port: threading.Lock() for port in ports}
+        self._claimed = {}  # 序列号 -> 端口
+        self._claim_lock = threading.Lock()
+
+    def claim(self, serials, port):
+        with self._claim_lock:
+            for serial in serials:
+                self._claimed.setdefault(serial, port)
+
+    def run(self, command, timeout):
+        port = int(command[1].rsplit(":", 1)[1])
+        command = command[2:]
+        if command == ["start"]:
+            if self.usb:
+                self.claim(self.fake_hdc.serials, port)
+            return "", ""
+        if command == ["kill"]:
+            return "", ""
+        if command[:1] == ["tconn"] and len(command) >= 2:
+            self.claim(command[1:2], port)
+        with self._locks[port]:
+            time.sleep(self.mux_cost)
+        serial = command_serial(command)
+        if command[:1] == ["-t"] and self._claimed.get(serial) != port:
+            return "", f"[Fail]Device not found: {serial}"
+        stdout, stderr, _ = self.fake_hdc.run(command)
+        if command == ["list", "targets"]:
+            serials = [serial for serial in stdout.splitlines() if self._claimed.get(serial) == port]
+            stdout = "\n".join(serials) if serials else "[Empty]"
+        return stdout, stderr
+
+
+def run_benchmark(devices=64, shard_counts=(1, 2, 4, 8), workers=32, latency=0.02, mux_cost=0.005):
+    """对不同分片数测量获取全部设备 UDID 的吞吐量。
+
+    设备归属不预设：USB 设备由最先启动的服务认领（分片数再多也集中在一个服务上），
+    网络设备通过 ShardedHdc 按哈希路由的 tconn 认领，分别报告两种情况。
+    """
+    from hdc_session import FakeHdc
+
+    print(f"分片基准: {devices} 台模拟设备，{workers} 个并发请求，会话耗时 {latency * 1000:.0f}ms，"
+          f"服务复用开销 {mux_cost * 1000:.0f}ms/命令")
+    for usb, label in ((True, "USB 设备（先启动的服务独占）"), (False, "网络设备（tconn 按哈希分配）")):
+        print(label)
+        baseline = None
+        for count in shard_counts:
+            fake = FakeHdc(devices=devices, latency=latency, online_ratio=1.0, seed=0)
+            ports = shard_ports(count)
+            servers = FakeShardServers(fake, ports, mux_cost=mux_cost, usb=usb)
+            sharded = ShardedHdc(servers.run, ports)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                if not usb:
+                    list(pool.map(lambda serial: sharded.call(["tconn", serial], 10), fake.serials))
+                stdout, _ = sharded.call(["list", "targets"], 10)
+                serials = stdout.splitlines()
+                started = time.monotonic()
+                results = list(pool.map(
+                    lambda serial: sharded.call(["-t", serial, "shell", "bm", "get", "-u"], 10), serials))
+                elapsed = time.monotonic() - started
+            resolved = sum(1 for stdout, _ in results if stdout and "udid" in stdout.lower())
+            rate = resolved / elapsed if elapsed else 0
+            baseline = baseline or rate
+            print(f"  {count} 个分片: {resolved}/{len(serials)} 台，{elapsed:.2f}s，"
+                  f"{rate:.0f} UDID/s（{rate / baseline:.1f}x）  {sharded.format_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="hdc 分片吞吐量基准测试（使用模拟 hdc 服务）")
+    parser.add_argument("--devices", type=int, default=64)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+    run_benchmark(devices=args.devices, shard_counts=args.shards, workers=args.workers)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+流式命令执行模块
+逐行读取子进程输出并回调，回调返回 True 时立即结束并终止子进程；
+只保留最近若干行输出，长时间运行的命令也不会无限占用内存。
+"""
+
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+
+# 默认保留的输出行数
+KEEP_LINES = 200
+
+
+def decode_output(data):
+    """subprocess.TimeoutExpired 中捕获的输出总是 bytes（或 None），转为文本"""
+    if data is None:
+        return ""
+    if isinstance(data, bytes):
+        return data.decode("utf-8", errors="replace")
+    return data
+
+
+class StreamResult:
+    """流式执行结果"""
+
+    __slots__ = ("stdout", "stderr", "returncode", "stopped_early", "timed_out")
+
+    def __init__(self, stdout, stderr, returncode, stopped_early, timed_out):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = returncode
+        self.stopped_early = stopped_early
+        self.timed_out = timed_out
+
+    def __repr__(self):
+        return (f"StreamResult(returncode={self.returncode}, stopped_early={self.stopped_early}, "
+                f"timed_out={self.timed_out}, stdout={self.stdout!r}, stderr={self.stderr!r})")
+
+
+def feed_lines(lines, on_line, keep_lines=KEEP_LINES):
+    """把已有的多行文本按流式方式喂给回调（用于回放），返回 (保留的行, 是否提前结束)"""
+    tail = deque(maxlen=keep_lines)
+    for line in lines:
+        tail.append(line)
+        if on_line is not None and on_line(line):
+            return tail, True
+    return tail, False
+
+
+def _pump(pipe, put):
+    """读取线程：逐行转交 put，EOF 后由本线程关闭管道（不在其他线程关闭正在读取的管道）"""
+    try:
+        for line in pipe:
+            put(line)
+    except (OSError, ValueError):
+        pass
+    finally:
+        pipe.close()
+
+
+def stream_process(argv, on_line=None, timeout=None, keep_lines=KEEP_LINES, **popen_kwargs):
+    """启动子进程并逐行处理标准输出
+
+    on_line(line) 返回 True 表示已拿到需要的结果，此时终止子进程并立即返回；
+    timeout 为整条命令的超时时间（秒），超时后结束子进程。
+    stdout 和 stderr 都在读取线程中读取，主流程按截止时间等待，即使子进程的后代进程仍占用管道
+    （EOF 迟迟不来），超时和提前结束也能按时返回；读取线程在管道关闭后自行退出。
+    """
+    process = subprocess.Popen(
+        argv,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        **popen_kwargs,
+    )
+
+    # stderr 只保留尾部；stdout 逐行经队列交给调用线程，None 表示 EOF
+    stderr_tail = deque(maxlen=keep_lines)
+    stderr_reader = threading.Thread(target=_pump, args=(process.stderr, stderr_tail.append),
+                                     name="hdc-stderr-reader", daemon=True)
+    stderr_reader.start()
+    lines = queue.Queue()
+    stdout_reader = threading.Thread(target=lambda: (_pump(process.stdout, lines.put), lines.put(None)),
+                                     name="hdc-stdout-reader", daemon=True)
+    stdout_reader.start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    stdout_tail = deque(maxlen=keep_lines)
+    stopped_early = timed_out = reached_eof = False
+    try:
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+            try:
+                line = lines.get(timeout=remaining)
+            except queue.Empty:
+                timed_out = True
+                break
+            if line is None:
+                reached_eof = True
+                break
+            line = line.rstrip("\r\n")
+            stdout_tail.append(line)
+            if on_line is not None and on_line(line):
+                stopped_early = True
+                break
+    finally:
+        if process.poll() is None:
+            if timed_out:
+                process.kill()
+            else:
+                process.terminate()
+        try:
+            process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        # 正常结束时等 stderr 读完；提前结束或超时时管道可能仍被后代进程占用，不等待
+        stderr_reader.join(timeout=1 if reached_eof else 0)
+
+    return StreamResult(
+        "\n".join(stdout_tail),
+        "".join(list(stderr_tail)),
+        process.returncode,
+        stopped_early,
+        timed_out,
+    )
+
+
+class UdidLineParser:
+    """逐行识别 `bm get -u` 的输出，识别到 UDID 后返回 True
+
+    输出可能是 "udid of current device is :XXXX"，也可能把 UDID 放在下一行。
+    """
+
+    def __init__(self):
+        self.udid = None
+        self._expect_value = False
+
+    def __call__(self, line):
+        text = line.strip()
+        if not text:
+            return False
+        if "udid" in text.lower() and ":" in text:
+            value = text.split(":", 1)[1].strip()
+            if value:
+                self.udid = value
+                return True
+            self._expect_value = True
+            return False
+        if self._expect_value:
+            self.udid = text
+            return True
+        return False
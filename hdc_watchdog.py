@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+hdc 服务看门狗模块
+hdc 服务卡死时，服务级命令（如 `list targets`）会超时、耗时异常或一直返回空设备列表。看门狗观察每次调用的结果，
+判定服务卡死后自动执行 `hdc kill` + `hdc start` 重启服务（带退避），
+并把卡死期间失败的请求（包括重启时正在执行的其他请求）在重启后重新执行一次。
+针对单台设备的命令超时不直接重启服务：先用一次短超时的 `list targets` 探测服务，服务也无响应时才重启，
+因此用户只在选择设备、没有点击刷新时服务卡死也能自动恢复。
+"""
+
+import statistics
+import threading
+import time
+from collections import deque
+
+from app_logging import logger
+
+# 连续多少次空设备列表（此前检测到过设备）视为卡死
+EMPTY_LIST_LIMIT = 3
+
+# 连续多少次耗时异常视为卡死；耗时超过中位数的 OUTLIER_FACTOR 倍且不少于 OUTLIER_FLOOR 秒算异常
+OUTLIER_LIMIT = 3
+OUTLIER_FACTOR = 5
+OUTLIER_FLOOR = 3.0
+LATENCY_WINDOW = 50
+
+# 重启退避（秒）：两次重启之间至少间隔 BACKOFF_BASE，之后逐次翻倍直到 BACKOFF_MAX
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# 重启命令的超时时间，以及重启期间其他请求最多等待多久
+RESTART_TIMEOUT = 10
+RECOVERY_WAIT = 30
+
+# 设备命令超时后探测服务的超时时间；探测成功后 PROBE_INTERVAL 秒内的其他设备超时不再重复探测
+PROBE_TIMEOUT = 5
+PROBE_INTERVAL = 10.0
+
+
+def command_kind(command):
+    """命令类别，用于分别统计耗时：去掉 -t <序列号>"""
+    if len(command) >= 2 and command[0] == "-t":
+        command = command[2:]
+    return " ".join(command[:3])
+
+
+def is_device_command(command):
+    """针对单台设备（`-t <序列号>`）或单个地址（`tconn`）的命令；其超时只说明该设备有问题"""
+    return bool(command) and command[0] in ("-t", "tconn")
+
+
+def is_empty_device_list(stdout):
+    return not stdout or "[Empty]" in stdout
+
+
+class HdcWatchdog:
+    """包裹 hdc 调用：检测卡死、重启服务、重试失败的请求
+
+    runner(command, timeout) 执行 hdc 命令并返回 (stdout, stderr)，异常时 stdout 为 None；
+    on_status(message) 用于在界面上报告重启进度（从工作线程调用）。
+    """
+
+    def __init__(self, runner, on_status=None):
+        self.runner = runner
+        self.on_status = on_status
+        self.recoveries = 0
+        self.last_recovery_seconds = None
+        self._lock = threading.Lock()          # 保护统计数据
+        self._recovery_lock = threading.Lock()  # 同一时间只允许一次重启
+        self._ready = threading.Event()
+        self._ready.set()
+        self._generation = 0
+        self._latencies = {}
+        self._consecutive_outliers = 0
+        self._consecutive_empty = 0
+        self._devices_seen = False
+        self._backoff = BACKOFF_BASE
+        self._next_allowed = 0.0
+        self._probe_lock = threading.Lock()
+        self._last_healthy_probe = None
+
+    def call(self, command, timeout, runner=None):
+        """执行命令；如判定 hdc 服务卡死，则重启服务后重试一次。runner 默认为构造时传入的 runner"""
+        runner = runner or self.runner
+        self._ready.wait(RECOVERY_WAIT)
+        generation = self._generation
+        stdout, stderr, stalled, timed_out = self._run_and_observe(runner, command, timeout)
+        if stalled:
+            retry = self.recover(generation)
+        elif timed_out and is_device_command(command):
+            retry = self.probe(generation)
+        else:
+            # 执行期间其他线程重启了服务（本请求多半因此失败），同样重新执行
+            retry = stdout is None and self._generation != generation
+        if retry:
+            self._ready.wait(RECOVERY_WAIT)
+            stdout, stderr, _, _ = self._run_and_observe(runner, command, timeout)
+        return stdout, stderr
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recoveries": self.recoveries,
+                "last_recovery_seconds": self.last_recovery_seconds,
+                "consecutive_empty": self._consecutive_empty,
+                "consecutive_outliers": self._consecutive_outliers,
+                "median_latency": {kind: statistics.median(values)
+                                   for kind, values in self._latencies.items() if values},
+            }
+
+    def _run_and_observe(self, runner, command, timeout):
+        """返回 (stdout, stderr, 是否表明服务卡死, 是否超时)"""
+        started = time.monotonic()
+        stdout, stderr = runner(command, timeout)
+        duration = time.monotonic() - started
+        timed_out = stdout is None and timeout is not None and duration >= timeout * 0.95
+        return stdout, stderr, self._observe(command, stdout, duration, timeout), timed_out
+
+    def probe(self, generation):
+        """设备命令超时后探测服务：`list targets` 也超时则重启服务。返回是否已重启（调用方应重试）"""
+        with self._probe_lock:
+            if self._generation != generation:
+                # 等待期间其他线程已重启服务
+                return True
+            now = time.monotonic()
+            if self._last_healthy_probe is not None and now - self._last_healthy_probe < PROBE_INTERVAL:
+                return False
+            stdout, _ = self.runner(["list", "targets"], PROBE_TIMEOUT)
+            if stdout is not None:
+                # 服务正常，超时的是设备本身
+                self._last_healthy_probe = time.monotonic()
+                return False
+            if time.monotonic() - now < PROBE_TIMEOUT * 0.95:
+                # 不是超时（例如找不到 hdc），重启无济于事
+                return False
+            logger.warning("Watchdog: hdc server did not answer a health probe after a device command timed out")
+            # 持有探测锁重启，同时超时的其他设备命令等到重启完成后直接重试
+            return self.recover(generation)
+
+    def _observe(self, command, stdout, duration, timeout):
+        """记录一次调用结果，返回这次结果是否表明服务卡死（需要重启后重试）"""
+        kind = command_kind(command)
+        # 单台设备卡住（例如某台手机无响应）不代表服务卡死，重启会打断其他设备的会话
+        server_command = not is_device_command(command)
+        with self._lock:
+            if stdout is None:
+                # 服务级命令超时视为卡死；其他异常（如找不到 hdc）重启也无济于事
+                return server_command and timeout is not None and duration >= timeout * 0.95
+
+            latencies = self._latencies.setdefault(kind, deque(maxlen=LATENCY_WINDOW))
+            if server_command and len(latencies) >= 5:
+                limit = max(statistics.median(latencies) * OUTLIER_FACTOR, OUTLIER_FLOOR)
+                self._consecutive_outliers = self._consecutive_outliers + 1 if duration > limit else 0
+            latencies.append(duration)
+            outlier_stall = self._consecutive_outliers >= OUTLIER_LIMIT
+
+            if kind == "list targets":
+                if is_empty_device_list(stdout):
+                    self._consecutive_empty += 1
+                    if self._devices_seen and self._consecutive_empty >= EMPTY_LIST_LIMIT:
+                        return True
+                else:
+                    self._consecutive_empty = 0
+                    self._devices_seen = True
+                    self._backoff = BACKOFF_BASE
+            return outlier_stall
+
+    def recover(self, generation):
+        """重启 hdc 服务；generation 之后已有其他线程完成重启时直接返回 True"""
+        with self._recovery_lock:
+            if self._generation != generation:
+                return True
+            now = time.monotonic()
+            if now < self._next_allowed:
+                return False
+            self._ready.clear()
+            try:
+                self._report("hdc 服务无响应，正在重启...")
+                started = time.monotonic()
+                self.runner(["kill"], RESTART_TIMEOUT)
+                stdout, stderr = self.runner(["start"], RESTART_TIMEOUT)
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self.recoveries += 1
+                    self.last_recovery_seconds = elapsed
+                    self._consecutive_empty = 0
+                    self._consecutive_outliers = 0
+                    self._next_allowed = time.monotonic() + self._backoff
+                    self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+                self._generation += 1
+                self._last_healthy_probe = None
+                if stdout is None:
+                    self._report(f"hdc 服务重启失败: {stderr}")
+                    return False
+                self._report(f"hdc 服务已自动重启（用时 {elapsed:.1f} 秒）")
+                return True
+            finally:
+                self._ready.set()
+
+    def _report(self, message):
+        logger.warning("Watchdog: %s", message)
+        if self.on_status is not None:
+            self.on_status(message)
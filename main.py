@@ -1,13 +1,37 @@
 # -*- coding: utf-8 -*-
 
+import argparse
+import logging
 import os
 import platform
+import shutil
 import subprocess
 import sys
+import tempfile
 import threading
 import tkinter as tk
-from time import sleep
-from tkinter import ttk
+from concurrent.futures import ThreadPoolExecutor
+from time import localtime, monotonic, sleep, strftime
+from tkinter import filedialog, ttk
+
+from app_logging import format_record, hdc_fields, logger, ring_buffer, setup_logging
+from coordinator import InstanceCoordinator
+from device_history import DeviceHistory
+from device_identity import DeviceIdentities
+from device_registry import FAILED, RESOLVED, DeviceRegistry
+from fanout import (DEFAULT_PARALLELISM, DEFAULT_TIMEOUT, MAX_PARALLELISM, FanOut, install_command,
+                    install_succeeded, shell_command, shell_succeeded)
+from hdc_session import FakeHdc, SessionRecorder, SessionReplayer, write_fake_hdc_launcher
+from hdc_shards import DEFAULT_SERVER_PORT, ShardedHdc, shard_ports, strip_server
+from hdc_stream import UdidLineParser, decode_output, feed_lines, stream_process
+from hdc_watchdog import HdcWatchdog
+from tcp_discovery import (DEFAULT_PORTS, guess_local_network, parse_hosts, parse_ports, scan_endpoints,
+                           tconn_succeeded)
+from udid_scheduler import UdidScheduler
+from ui_monitor import LagMonitor, StressScenario
+from profiler import AppProfiler
+from reconcile import RegisteredDevices, export_new_devices
+from soak import SoakScenario
 
 # 版本信息 - 从 version_info 模块导入
 try:
@@ -22,10 +46,29 @@ except ImportError:
     APP_DESCRIPTION = "HarmonyOS UDID 获取工具"
     APP_COPYRIGHT = "Copyright © 2025 仙银. All rights reserved."
 
+# 用户数据目录（历史记录、日志等）
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".harmony-udid-tool")
+
+# hdc 命令默认超时时间与获取 UDID 的超时时间（秒）
+HDC_TIMEOUT = 20
+UDID_TIMEOUT = 15
+
+# 同时执行 hdc tconn 的数量
+TCONN_WORKERS = 8
+
+# 设备历史搜索框停止输入多久后才检索（毫秒）
+SEARCH_DEBOUNCE_MS = 120
+
 
 class HdcUdidApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, recorder=None, replayer=None, profiler=None, keep_history=True, registered_path=None,
+                 coordinate=True, hdc_shards=1, hdc_base_port=DEFAULT_SERVER_PORT, hdc_path=None, shared_dir=None):
         super().__init__()
+        self.profiler = profiler
+        self.lag_monitor = None
+        # hdc 会话录制/回放，回放模式下不需要真实的 hdc
+        self.recorder = recorder
+        self.replayer = replayer
         self.title("HarmonyOS UDID 获取工具")
         # --- 设置图标 ---
         self.set_app_icon()
@@ -39,6 +82,17 @@ class HdcUdidApp(tk.Tk):
             helpmenu = tk.Menu(menubar, tearoff=0)
             helpmenu.add_command(label="关于", command=self.show_about)
             menubar.add_cascade(label="帮助", menu=helpmenu)
+
+        toolmenu = tk.Menu(menubar, tearoff=0)
+        toolmenu.add_command(label="设备历史", command=self.show_history)
+        toolmenu.add_command(label="发现网络设备", command=self.show_tcp_discovery)
+        toolmenu.add_command(label="批量安装/执行命令", command=self.show_fanout)
+        toolmenu.add_separator()
+        toolmenu.add_command(label="加载已注册设备列表", command=self.choose_registered_list)
+        toolmenu.add_command(label="导出未注册设备", command=self.export_unregistered)
+        toolmenu.add_separator()
+        toolmenu.add_command(label="诊断", command=self.show_diagnostics)
+        menubar.add_cascade(label="工具", menu=toolmenu)
        
         self.config(menu=menubar)
 
@@ -104,9 +158,60 @@ class HdcUdidApp(tk.Tk):
         
         style.configure('TLabel', font=default_font, background=COLOR_BACKGROUND)
 
-        self.hdc_path = self.find_hdc_executable()
+        # hdc_path 用于指定其他 hdc 可执行文件（例如浸泡测试的模拟 hdc）
+        self.hdc_path = hdc_path or (None if self.replayer else self.find_hdc_executable())
+        # hdc 服务卡死时自动重启，并在状态栏提示
+        on_status = lambda message: self.after(0, self.status_value.set, message)
+        if hdc_shards > 1 and self.replayer is None:
+            # 设备很多时在多个端口上运行 hdc 服务，每个分片各有看门狗，调用接口与 HdcWatchdog 相同
+            self.shards = ShardedHdc(self.exec_hdc_command, shard_ports(hdc_shards, hdc_base_port), on_status=on_status)
+            self.watchdog = self.shards
+        else:
+            self.shards = None
+            self.watchdog = HdcWatchdog(self.exec_hdc_command, on_status=on_status)
+        # 设备状态统一保存在注册表中，变更后刷新当前设备的显示
+        self.devices = DeviceRegistry()
+        self.devices.subscribe(self.on_devices_changed)
+        self._render_pending = False
+        # 同一设备的多个连接（USB/TCP）按 UDID 归并
+        self.identities = DeviceIdentities(self.devices)
+        self.display_to_serial = {}  # 列表显示名 -> 序列号
+        self._snapshot_online = None  # 从实例上次显示的快照设备列表
+        # 用户选择的设备优先获取 UDID，其余设备在后台预取
+        self.selected_serial = None
+        self.udid_scheduler = UdidScheduler(self.fetch_udid_task, self.on_udid_result, self.is_resolved)
+        # 同一主机打开多个实例时只有主实例访问 hdc，其余实例读取共享快照；
+        # 默认只协调本用户的实例，指定 shared_dir 后与共用该目录的其他账户协调
+        self.coordinator = None
+        if coordinate and self.replayer is None:
+            try:
+                self.coordinator = InstanceCoordinator(
+                    shared_dir or DATA_DIR, self.build_snapshot, self.apply_snapshot,
+                    on_refresh_request=lambda: self.after(0, self.on_refresh_request),
+                    on_role_change=lambda is_leader: self.after(0, self.on_became_leader),
+                    shared=shared_dir is not None)
+                self.coordinator.start()
+            except OSError as e:
+                logger.error("Error starting instance coordination: %s", e)
+                self.coordinator = None
         self.status_value = tk.StringVar(value="请刷新设备")
 
+        # --- 设备历史 ---
+        self.history = None
+        if keep_history:
+            try:
+                self.history = DeviceHistory(self.get_data_path("device_history.db"))
+            except Exception as e:
+                logger.error("Error opening device history: %s", e)
+
+        # --- 已注册设备比对 ---
+        self.registered = RegisteredDevices()
+        if registered_path:
+            try:
+                self.registered.load(registered_path)
+            except (OSError, ValueError) as e:
+                logger.error("Error loading registered devices: %s", e)
+
         # --- UI 布局 ---
         container = tk.Frame(self, bg=COLOR_BACKGROUND)
         container.pack(expand=True, fill=tk.BOTH, padx=30, pady=18)
@@ -168,8 +273,8 @@ class HdcUdidApp(tk.Tk):
         self.udid_menu.add_command(label="复制", command=self.copy_udid_selection)
 
         # --- 状态栏 ---
-        status_bar = tk.Label(container, textvariable=self.status_value, font=("Arial", 9), fg="#888", bg=COLOR_BACKGROUND, anchor="w")
-        status_bar.pack(fill='x', pady=(2, 8))
+        self.status_bar = tk.Label(container, textvariable=self.status_value, font=("Arial", 9), fg="#888", bg=COLOR_BACKGROUND, anchor="w")
+        self.status_bar.pack(fill='x', pady=(2, 8))
 
         # --- 按钮区域 ---
         button_frame = tk.Frame(container, bg=COLOR_BACKGROUND)
@@ -192,6 +297,16 @@ class HdcUdidApp(tk.Tk):
         self.protocol("WM_DELETE_WINDOW", self.on_exit)
         self.refresh_devices()
 
+    def start_lag_monitor(self, overlay=False):
+        """开启事件循环延迟监测，overlay 为 True 时在状态栏右侧显示实时延迟"""
+        self.lag_monitor = LagMonitor(self)
+        self.lag_monitor.start()
+        if overlay:
+            lag_label = tk.Label(self.status_bar, font=("Arial", 9), fg="#c0392b", bg=self.status_bar.cget("bg"))
+            lag_label.place(relx=1.0, rely=0.5, anchor="e")
+            self.lag_monitor.attach_overlay(lag_label)
+        return self.lag_monitor
+
     def get_resource_path(self, relative_path):
         """获取资源文件的绝对路径，兼容 PyInstaller 打包"""
         try:
@@ -202,6 +317,11 @@ class HdcUdidApp(tk.Tk):
             base_path = os.path.dirname(os.path.abspath(__file__))
         return os.path.join(base_path, relative_path)
 
+    def get_data_path(self, relative_path):
+        """获取用户数据文件的绝对路径（历史记录等），打包后也可写"""
+        os.makedirs(DATA_DIR, exist_ok=True)
+        return os.path.join(DATA_DIR, relative_path)
+
     def set_app_icon(self):
         """跨平台设置应用图标"""
         if platform.system() == "Windows":
@@ -239,38 +359,113 @@ class HdcUdidApp(tk.Tk):
         
         return hdc_path 
 
-    def run_hdc_command(self, command):
+    def prepare_hdc_launch(self):
+        """准备启动 hdc 所需的路径、环境变量和 Windows 启动参数"""
+        hdc_path = self.hdc_path or self.find_hdc_executable()
+        if platform.system() != "Windows":
+            if not os.access(hdc_path, os.X_OK):
+                os.chmod(hdc_path, 0o755)
+        
+        # 设置动态库搜索路径
+        env = os.environ.copy()
+        if platform.system() == "Darwin":
+            # macOS 动态库路径 - 使用资源目录而不是 hdc 文件路径
+            lib_dir = os.path.dirname(self.get_resource_path('libusb_shared.dylib'))
+            env["DYLD_LIBRARY_PATH"] = lib_dir
+            # 强制加载指定路径的库（即使系统已有同名库）
+            env["DYLD_FORCE_FLAT_NAMESPACE"] = "1"
+
+        startupinfo = None
+        if platform.system() == "Windows":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        return hdc_path, env, startupinfo
+
+    def run_hdc_command(self, command, timeout=HDC_TIMEOUT):
+        return self.watchdog.call(command, timeout)
+
+    def exec_hdc_command(self, command, timeout=HDC_TIMEOUT):
+        """直接执行一次 hdc 命令（不经过看门狗），超时或出错时 stdout 为 None"""
+        if self.replayer is not None:
+            stdout, stderr, _ = self.replayer.run(command)
+            if stdout is None:
+                return None, stderr
+            return stdout.strip(), stderr.strip()
         try:
-            hdc_path = self.find_hdc_executable()
-            if platform.system() != "Windows":
-                if not os.access(hdc_path, os.X_OK):
-                    os.chmod(hdc_path, 0o755)
-            
-            # 设置动态库搜索路径
-            env = os.environ.copy()
-            if platform.system() == "Darwin":
-                # macOS 动态库路径 - 使用资源目录而不是 hdc 文件路径
-                lib_dir = os.path.dirname(self.get_resource_path('libusb_shared.dylib'))
-                env["DYLD_LIBRARY_PATH"] = lib_dir
-                # 强制加载指定路径的库（即使系统已有同名库）
-                env["DYLD_FORCE_FLAT_NAMESPACE"] = "1"
-
-            startupinfo = None
-            if platform.system() == "Windows":
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            hdc_path, env, startupinfo = self.prepare_hdc_launch()
+            started = monotonic()
             process = subprocess.run(
                 [hdc_path] + command,
-                capture_output=True, text=True, encoding='utf-8', check=False, startupinfo=startupinfo
+                capture_output=True, text=True, encoding='utf-8', check=False, startupinfo=startupinfo,
+                env=env, timeout=timeout
             )
-            print(f"Command: {' '.join([hdc_path] + command)}")
-            print(f"process: {process}")
-          
+            self.after_hdc_call(command, process.returncode, started, process.stdout, process.stderr)
+
             return process.stdout.strip(), process.stderr.strip()
+        except subprocess.TimeoutExpired as e:
+            # 超时的调用同样录制、记录日志，回放时会重现超时
+            self.after_hdc_call(command, None, started, decode_output(e.stdout), decode_output(e.stderr),
+                                timed_out=True)
+            return None, f"Command timed out after {timeout} seconds"
+        except Exception as e:
+            logger.warning("hdc %s failed: %s", " ".join(command), e, extra=hdc_fields(command))
+            return None, str(e)
+
+    def exec_routed_command(self, command, timeout=HDC_TIMEOUT):
+        """不经过看门狗直接执行；分片模式下发往设备所属的 hdc 服务"""
+        if self.shards is not None:
+            command = self.shards.route(command)
+        return self.exec_hdc_command(command, timeout)
+
+    def after_hdc_call(self, command, returncode, started, stdout, stderr, timed_out=False):
+        """每次 hdc 调用结束后：录制会话、统计连接耗时、记录日志"""
+        duration = monotonic() - started
+        # 录制的会话与分片无关，回放时不需要相同的分片配置
+        if self.recorder is not None:
+            self.recorder.record(strip_server(command), stdout, stderr, returncode, started, duration,
+                                 timed_out=timed_out)
+        self.identities.record_latency(strip_server(command), duration, timed_out=timed_out)
+        if timed_out:
+            logger.warning("hdc %s timed out (%.3fs)", " ".join(command), duration,
+                           extra=hdc_fields(command, returncode, duration, stdout, stderr))
+        # 日志关闭时只有一次级别判断的开销
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("hdc %s -> %s (%.3fs)", " ".join(command), returncode, duration,
+                         extra=hdc_fields(command, returncode, duration, stdout, stderr))
+
+    def stream_hdc_command(self, command, on_line=None, timeout=None):
+        """流式执行 hdc 命令：每读到一行就调用 on_line，返回 True 时立即结束并终止 hdc。
+        适用于拿到结果即可返回的命令，以及需要逐行处理、不宜整体缓存输出的长时间命令。
+        hdc 服务卡死重启后会重新执行，on_line 可能再次从第一行开始收到输出。"""
+        return self.watchdog.call(command, timeout,
+                                  runner=lambda retry_command, retry_timeout: self.exec_stream_hdc_command(
+                                      retry_command, on_line, retry_timeout))
+
+    def exec_stream_hdc_command(self, command, on_line=None, timeout=None):
+        if self.replayer is not None:
+            stdout, stderr, _ = self.replayer.run(command)
+            if stdout is None:
+                return None, stderr
+            lines, _ = feed_lines(stdout.splitlines(), on_line)
+            return "\n".join(lines).strip(), stderr.strip()
+        try:
+            hdc_path, env, startupinfo = self.prepare_hdc_launch()
+            started = monotonic()
+            result = stream_process([hdc_path] + command, on_line=on_line, timeout=timeout, env=env,
+                                    startupinfo=startupinfo)
+            self.after_hdc_call(command, result.returncode, started, result.stdout, result.stderr,
+                                timed_out=result.timed_out)
+
+            if result.timed_out:
+                return None, f"Command timed out after {timeout} seconds"
+            return result.stdout.strip(), result.stderr.strip()
         except Exception as e:
-            print(f"Error running command: {command} - {e}")
+            logger.warning("hdc %s failed: %s", " ".join(command), e, extra=hdc_fields(command))
             return None, str(e)
+
     def refresh_devices(self):
+        if self.profiler is not None:
+            self.profiler.snapshot_memory("刷新设备")
         self.status_value.set("正在刷新设备列表...")
         # self.device_combobox.set('')
         self.device_combobox.config(state=tk.DISABLED)
@@ -280,27 +475,76 @@ class HdcUdidApp(tk.Tk):
         threading.Thread(target=self.fetch_devices_task, daemon=True).start()
 
     def fetch_devices_task(self):
+        self.reload_registered_list()
+        if not self.queries_hdc():
+            # 由主实例查询 hdc，这里请求主实例刷新并先显示当前快照
+            self.coordinator.request_refresh()
+            self.apply_snapshot(self.coordinator.read() or {}, refreshing=True)
+            return
         list_stdout, _ = self.run_hdc_command(["list", "targets"])
+        list_stdout = list_stdout or ""
         device_sns = list_stdout.splitlines()
         if not device_sns or  "[Empty]" in list_stdout:
+            device_sns = []
+        self.devices.set_online(device_sns)
+        self.record_sightings(device_sns)
+        if not device_sns:
             self.after(0, self.update_device_list, [], "未检测到设备，请连接...")
             return
-        self.after(0, self.update_device_list, device_sns, "请从列表中选择一个设备")
+        device_names, serials = self.group_device_names(device_sns)
+        self.after(0, self.update_device_list, device_names, "请从列表中选择一个设备", serials)
+        self.udid_scheduler.prefetch(device_sns)
+
+    def group_device_names(self, device_sns):
+        """同一设备的多个连接合并为一项，返回 (显示名列表, 对应的首选序列号列表)"""
+        device_names, serials = [], []
+        for primary, aliases in self.identities.group(device_sns):
+            name = f"{primary}（同一设备: {', '.join(aliases)}）" if aliases else primary
+            device_names.append(name + self.registration_mark(primary))
+            serials.append(primary)
+        return device_names, serials
+
+    def registration_mark(self, serial):
+        """已加载注册列表且已获取 UDID 时，返回追加到列表显示名的注册标记"""
+        udid = self.devices.udid_for(serial)
+        if udid is None or not self.registered.loaded:
+            return ""
+        return " [已注册]" if self.registered.contains(udid) else " [未注册]"
+
+    def refresh_device_names(self):
+        """UDID 或注册列表变化后只更新列表中的显示名，不改变选择、焦点和状态栏"""
+        device_names, serials = self.group_device_names(self.devices.online_serials())
+        if serials != list(self.display_to_serial.values()):
+            # 分组有变化（例如发现了别名），走完整的列表更新
+            self.regroup_devices()
+            return
+        self.display_to_serial = dict(zip(device_names, serials))
+        self.device_combobox['values'] = device_names
+        if self.selected_serial in serials:
+            self.device_combobox.set(device_names[serials.index(self.selected_serial)])
 
-    def update_device_list(self, device_names, status):
+    def regroup_devices(self):
+        """发现新的别名后重新合并设备列表"""
+        device_names, serials = self.group_device_names(self.devices.online_serials())
+        if device_names:
+            self.update_device_list(device_names, self.status_value.get(), serials)
+
+    def update_device_list(self, device_names, status, serials=None):
         # 记录当前选中项
-        current = self.device_combobox.get()
+        current = self.selected_serial
+        serials = serials or device_names
+        self.display_to_serial = dict(zip(device_names, serials))
         self.device_combobox['values'] = device_names
         if device_names:
             self.device_combobox.config(state="readonly")
-            # 如果当前选中项还在新列表里，则保持不变，否则选中第一个
-            if current in device_names:
-                self.device_combobox.set(current)
-            else:
-                self.device_combobox.set(device_names[0])
+            # 如果当前选中的设备还在新列表里（包括以别名出现），则保持不变，否则选中第一个
+            index = next((i for i, serial in enumerate(serials)
+                          if serial == current or self.identities.same_device(serial, current)), 0)
+            self.device_combobox.set(device_names[index])
             self.on_device_select(None) # 自动触发第一个设备的选择事件
         else:
             # 只有真正没有设备时才清空
+            self.selected_serial = None
             self.device_combobox.set('')
             self.device_combobox.config(state="disabled")
             self.update_ui_text("未检测到设备")
@@ -310,19 +554,216 @@ class HdcUdidApp(tk.Tk):
     def on_device_select(self, event):
         selected_display_name = self.device_combobox.get()
         if selected_display_name:
-            self.status_value.set(f"正在为 {selected_display_name} 获取UDID...")
-            self.copy_button.config(state=tk.DISABLED)
-            self.update_ui_text("...")
-            threading.Thread(target=self.fetch_udid_task, args=(selected_display_name,), daemon=True).start()
+            serial = self.display_to_serial.get(selected_display_name, selected_display_name)
+            self.selected_serial = serial
+            if not self.is_resolved(serial) and self.queries_hdc():
+                self.udid_scheduler.request(serial)
+            # 已预取过的设备直接显示
+            self.render_selected_device()
         # 取消 Combobox 的选中高亮
         self.device_combobox.selection_clear()
         self.device_combobox.icursor(0)
         self.focus()  # 让 Combobox 失去焦点
 
+    def queries_hdc(self):
+        """多实例共享时只有主实例访问 hdc 查询设备列表和 UDID"""
+        return self.coordinator is None or self.coordinator.is_leader
+
+    def build_snapshot(self):
+        """主实例发布的共享快照（协调线程中调用）"""
+        return {
+            "online": self.devices.online_serials(),
+            "devices": [{"serial": record.serial, "udid": record.udid, "model": record.model or None}
+                        for record in self.devices.resolved()],
+            "failed": [{"serial": record.serial, "error": record.error} for record in self.devices.failed()],
+        }
+
+    def apply_snapshot(self, snapshot, refreshing=False):
+        """从实例：把主实例的快照写入注册表并刷新设备列表（工作线程中调用）。
+        refreshing 表示由本实例的刷新按钮触发，此时总是重建列表以结束刷新状态"""
+        for device in snapshot.get("devices", []):
+            serial, udid, model = device.get("serial"), device.get("udid"), device.get("model")
+            if not serial or not udid:
+                continue
+            record = self.devices.get(serial)
+            if record is None or record.udid != udid:
+                self.devices.set_udid(serial, udid)
+            if model and (record is None or record.model != model):
+                self.devices.set_model(serial, model)
+        for device in snapshot.get("failed", []):
+            serial, error = device.get("serial"), device.get("error")
+            record = self.devices.get(serial) if serial else None
+            if serial and (record is None or record.state != FAILED or record.error != error):
+                self.devices.set_failed(serial, error)
+        online = snapshot.get("online", [])
+        self.devices.set_online(online)
+        self.after(0, self.show_snapshot, online, refreshing)
+
+    def show_snapshot(self, online, refreshing=False):
+        """从实例：设备列表或分组有变化时才重建列表，否则只更新显示名和设备信息，不打断用户的选择和焦点；
+        用户点击刷新后（列表和按钮已禁用）总是走 update_device_list 恢复控件"""
+        shown, self._snapshot_online = self._snapshot_online, online
+        if not online:
+            if refreshing or shown != online:
+                self.update_device_list([], "未检测到设备，请连接...")
+            return
+        device_names, serials = self.group_device_names(online)
+        if refreshing or shown != online or serials != list(self.display_to_serial.values()):
+            self.update_device_list(device_names, "请从列表中选择一个设备（设备信息由其他已打开的实例提供）", serials)
+            return
+        self.refresh_device_names()
+        self.render_selected_device()
+
+    def on_refresh_request(self):
+        """主实例收到其他实例的刷新请求；正在刷新时忽略"""
+        if str(self.refresh_button["state"]) != tk.DISABLED:
+            self.refresh_devices()
+
+    def on_became_leader(self):
+        """原主实例已退出，由本实例接管 hdc 查询"""
+        logger.info("Taking over hdc queries from previous leader")
+        self.refresh_devices()
+
+    def is_resolved(self, serial):
+        record = self.devices.get(serial)
+        return record is not None and record.state == RESOLVED
+
     def fetch_udid_task(self, selected_display_name):
-        udid_stdout, udid_stderr = self.run_hdc_command(["-t", selected_display_name, "shell", "bm", "get", "-u"])
+        """获取 UDID，由调度器在工作线程中调用，结果写入设备注册表，返回 (udid, status, 是否成功)"""
+        known_udid = self.devices.udid_for(selected_display_name)
+        if known_udid is not None:
+            # 已知序列号（例如重连的 USB 设备），无需再次查询
+            return known_udid, "成功获取UDID", True
+        self.devices.set_resolving(selected_display_name)
+        # 识别到 UDID 行即返回，不等待 shell 会话结束
+        udid_stdout, udid_stderr = self.stream_hdc_command(["-t", selected_display_name, "shell", "bm", "get", "-u"],
+                                                           on_line=UdidLineParser(), timeout=UDID_TIMEOUT)
         final_udid, final_status = self.parse_udid(udid_stdout, udid_stderr)
-        self.after(0, self.update_udid_display, final_udid, final_status)
+        resolved = final_status == "成功获取UDID"
+        if resolved:
+            if self.devices.set_udid(selected_display_name, final_udid):
+                # 这是某台已在列表中的设备的另一个连接
+                self.after(0, self.regroup_devices)
+            elif self.registered.loaded:
+                # 在列表中标记这台设备是否已注册
+                self.after(0, self.refresh_device_names)
+        else:
+            self.devices.set_failed(selected_display_name, final_status or f"设备返回无效结果: {final_udid}")
+        return final_udid, final_status, resolved
+
+    def on_udid_result(self, serial, udid, status, resolved):
+        """调度器回调（工作线程）：界面由注册表变更通知刷新，这里只记录历史"""
+        record = self.devices.get(serial)
+        if not resolved and (record is None or record.state != FAILED):
+            # fetch_udid_task 抛出异常时注册表还停留在获取中
+            self.devices.set_failed(serial, status)
+        if self.history is not None and resolved:
+            self.history.record(serial, udid, record.model or None if record is not None else None)
+            if record is None or record.model is None:
+                # 型号查询是额外的 hdc 调用，放到后台，不占用用户请求线程
+                self.udid_scheduler.background(
+                    lambda: self.history.record(serial, udid, self.fetch_device_model(serial)))
+
+    def record_sightings(self, serials):
+        """每次刷新时更新已知设备的最近出现时间；已获取过 UDID 的设备不会再经过 on_udid_result"""
+        if self.history is None:
+            return
+        for serial in serials:
+            record = self.devices.get(serial)
+            if record is not None and record.state == RESOLVED:
+                self.history.record(serial, record.udid, record.model or None)
+
+    def on_devices_changed(self, version, serials):
+        """注册表变更回调（任意线程）：当前设备有变化时合并为一次界面刷新"""
+        if self.coordinator is not None:
+            self.coordinator.mark_dirty()
+        if self.selected_serial in serials and not self._render_pending:
+            self._render_pending = True
+            self.after(0, self.render_selected_device)
+
+    def render_selected_device(self):
+        """按注册表中当前设备的状态刷新 UDID 显示"""
+        self._render_pending = False
+        serial = self.selected_serial
+        if serial is None:
+            return
+        record = self.devices.get(serial)
+        if record is not None and record.state == RESOLVED:
+            self.update_udid_display(record.udid, "成功获取UDID" + self.describe_registration(record.udid))
+        elif record is not None and record.state == FAILED:
+            self.update_udid_display("获取UDID失败", record.error)
+        else:
+            self.status_value.set(f"正在为 {serial} 获取UDID...")
+            self.copy_button.config(state=tk.DISABLED)
+            self.update_ui_text("...")
+
+    def describe_registration(self, udid):
+        """已加载注册列表时，返回追加到状态栏的注册状态"""
+        if not self.registered.loaded:
+            return ""
+        if self.registered.contains(udid):
+            return "（已注册）"
+        return "（未注册，需加入调试证书）"
+
+    def reload_registered_list(self):
+        """注册列表文件有变化时增量重新加载（在工作线程中调用）"""
+        try:
+            self.registered.reload_if_changed()
+        except (OSError, ValueError) as e:
+            logger.warning("Error reloading registered devices: %s", e)
+
+    def choose_registered_list(self):
+        path = filedialog.askopenfilename(
+            parent=self, title="选择已注册设备列表",
+            filetypes=[("设备列表", "*.csv *.json"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            self.registered.load(path)
+        except (OSError, ValueError) as e:
+            self.status_value.set(f"加载失败: {e}")
+            return
+        # 刷新列表中各设备的注册标记和当前设备的显示
+        self.refresh_device_names()
+        self.render_selected_device()
+        self.status_value.set(f"已加载 {len(self.registered.udids)} 台已注册设备")
+
+    def export_unregistered(self):
+        if not self.registered.loaded:
+            self.status_value.set("请先加载已注册设备列表")
+            return
+        # 同一设备的多个连接只导出一次
+        unique_devices = {record.udid: record.serial for record in self.devices.resolved()}
+        new_devices = [(serial, udid) for udid, serial in unique_devices.items()
+                       if not self.registered.contains(udid)]
+        if not new_devices:
+            self.show_toast("没有未注册的设备")
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self, title="导出未注册设备", defaultextension=".csv",
+            initialfile="unregistered_devices.csv", filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            export_new_devices(path, new_devices)
+        except OSError as e:
+            self.status_value.set(f"导出失败: {e}")
+            return
+        self.status_value.set(f"已导出 {len(new_devices)} 台未注册设备")
+
+    def fetch_device_model(self, serial):
+        """获取设备型号（缓存在注册表中），失败返回 None"""
+        record = self.devices.get(serial)
+        if record is None or record.model is None:
+            model_stdout, model_stderr = self.run_hdc_command(
+                ["-t", self.identities.route(serial), "shell", "param", "get", "const.product.model"])
+            if model_stdout and not model_stderr and "fail" not in model_stdout.lower():
+                model = model_stdout.splitlines()[0].strip()
+            else:
+                model = ""  # 查询过但没有结果，不再重复查询
+            self.devices.set_model(serial, model)
+            return model or None
+        return record.model or None
 
     def parse_udid(self, stdout, stderr):
         if stdout and "udid" in stdout.lower():
@@ -345,7 +786,9 @@ class HdcUdidApp(tk.Tk):
     def update_udid_display(self, udid, status):
         self.update_ui_text(udid)
         self.status_value.set(status)
-        if "失败" not in udid and "未检测" not in udid:
+        # 只有注册表中确认获取成功的 UDID 才允许复制
+        record = self.devices.get(self.selected_serial)
+        if record is not None and record.state == RESOLVED and record.udid == udid:
             self.copy_button.config(state=tk.NORMAL)
         else:
             self.copy_button.config(state=tk.DISABLED)
@@ -357,10 +800,10 @@ class HdcUdidApp(tk.Tk):
         self.udid_text.config(state=tk.DISABLED)
 
     def copy_udid(self):
-        current_udid = self.udid_text.get("1.0", tk.END).strip()
-        if current_udid and "失败" not in current_udid and "未检测" not in current_udid and "..." not in current_udid:
+        record = self.devices.get(self.selected_serial)
+        if record is not None and record.state == RESOLVED:
             self.clipboard_clear()
-            self.clipboard_append(current_udid)
+            self.clipboard_append(record.udid)
             self.show_toast("UDID 已复制到剪贴板")
 
     def show_toast(self, message):
@@ -396,8 +839,303 @@ class HdcUdidApp(tk.Tk):
         webbrowser.open_new("https://ihongren.github.io/donate.html")
 
     def on_exit(self):
+        self.udid_scheduler.stop()
+        if self.coordinator is not None:
+            # 立即释放主实例锁，其他实例无需等待进程退出即可接管
+            self.coordinator.stop()
+        if self.history is not None:
+            self.history.close()
+        if self.recorder is not None:
+            self.recorder.close()
         self.destroy()
 
+    def show_diagnostics(self):
+        """诊断窗口：查看内存中最近的日志（含最近的 hdc 命令及输出）"""
+        window = tk.Toplevel(self)
+        window.title("诊断")
+        window.geometry("760x420")
+
+        toolbar = tk.Frame(window)
+        toolbar.pack(fill='x', padx=10, pady=(10, 4))
+        tk.Label(toolbar, text="级别", font=("Arial", 11)).pack(side=tk.LEFT)
+        levels = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+        level_combobox = ttk.Combobox(toolbar, values=list(levels), state="readonly", width=10)
+        level_combobox.set("DEBUG")
+        level_combobox.pack(side=tk.LEFT, padx=8)
+        watchdog_value = tk.StringVar()
+        tk.Label(toolbar, textvariable=watchdog_value, font=("Arial", 9), fg="#888").pack(side=tk.LEFT, padx=8)
+
+        text = tk.Text(window, font=("Courier", 10), wrap=tk.NONE)
+        text.pack(fill='both', expand=True, padx=10)
+
+        def refresh(*_):
+            records = ring_buffer.snapshot(levels[level_combobox.get()])
+            text.config(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert("1.0", "\n".join(format_record(record) for record in records))
+            text.see(tk.END)
+            text.config(state=tk.DISABLED)
+            stats = self.watchdog.stats()
+            watchdog_text = f"hdc 服务自动重启 {stats['recoveries']} 次"
+            if self.shards is not None:
+                watchdog_text += f"  分片 {self.shards.format_stats()}"
+            watchdog_value.set(watchdog_text)
+
+        def copy_all():
+            self.clipboard_clear()
+            self.clipboard_append(text.get("1.0", tk.END))
+            self.show_toast("日志已复制到剪贴板")
+
+        button_frame = tk.Frame(window)
+        button_frame.pack(fill='x', padx=10, pady=8)
+        ttk.Button(button_frame, text="刷新", command=refresh, style='Rounded.TButton').pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="复制全部", command=copy_all, style='Rounded.TButton').pack(side=tk.LEFT, padx=8)
+        level_combobox.bind("<<ComboboxSelected>>", refresh)
+        refresh()
+
+    def show_fanout(self):
+        """批量执行窗口：对选中的设备并发安装 HAP 或执行 shell 命令，表格中实时显示每台设备的进度"""
+        devices = self.identities.group(self.devices.online_serials())
+        if not devices:
+            self.show_toast("请先刷新设备")
+            return
+
+        window = tk.Toplevel(self)
+        window.title("批量安装/执行命令")
+        window.geometry("680x460")
+
+        form = tk.Frame(window)
+        form.pack(fill='x', padx=10, pady=(10, 4))
+        form.columnconfigure(2, weight=1)
+        mode_value = tk.StringVar(value="install")
+        hap_value = tk.StringVar()
+        shell_value = tk.StringVar()
+        parallel_value = tk.IntVar(value=DEFAULT_PARALLELISM)
+        timeout_value = tk.IntVar(value=DEFAULT_TIMEOUT)
+
+        def choose_hap():
+            path = filedialog.askopenfilename(parent=window, title="选择 HAP", filetypes=[("HAP", "*.hap"), ("所有文件", "*.*")])
+            if path:
+                hap_value.set(path)
+                mode_value.set("install")
+
+        ttk.Radiobutton(form, text="安装 HAP", variable=mode_value, value="install").grid(row=0, column=0, sticky='w')
+        ttk.Button(form, text="选择...", command=choose_hap).grid(row=0, column=1, padx=6)
+        ttk.Entry(form, textvariable=hap_value).grid(row=0, column=2, sticky='ew')
+        ttk.Radiobutton(form, text="Shell 命令", variable=mode_value, value="shell").grid(row=1, column=0, sticky='w', pady=4)
+        ttk.Entry(form, textvariable=shell_value).grid(row=1, column=1, columnspan=2, sticky='ew', pady=4)
+
+        options = tk.Frame(window)
+        options.pack(fill='x', padx=10)
+        tk.Label(options, text="并发数").pack(side=tk.LEFT)
+        ttk.Spinbox(options, from_=1, to=MAX_PARALLELISM, width=5, textvariable=parallel_value).pack(side=tk.LEFT, padx=(4, 12))
+        tk.Label(options, text="单台超时(秒)").pack(side=tk.LEFT)
+        ttk.Spinbox(options, from_=5, to=3600, width=6, textvariable=timeout_value).pack(side=tk.LEFT, padx=4)
+
+        columns = ("serial", "state", "duration", "output")
+        tree = ttk.Treeview(window, columns=columns, show="headings", selectmode="extended")
+        for column, heading, width in zip(columns, ("设备", "状态", "耗时", "输出"), (190, 70, 70, 320)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor="w")
+        tree.pack(fill='both', expand=True, padx=10, pady=6)
+        for primary, _ in devices:
+            tree.insert("", tk.END, iid=primary, values=(primary, "", "", ""))
+        tree.selection_set(tree.get_children())
+
+        summary_value = tk.StringVar(value="在表格中选择设备（默认全部），然后点击开始")
+        tk.Label(window, textvariable=summary_value, font=("Arial", 9), fg="#555", anchor="w", justify="left").pack(fill='x', padx=10)
+
+        running = []  # 正在执行的 FanOut，关闭窗口时取消
+
+        def show_progress(result):
+            # 窗口关闭后已开始的设备仍会回报进度
+            if not window.winfo_exists():
+                return
+            duration = f"{result.duration:.1f}s" if result.duration is not None else ""
+            output = result.output.splitlines()[0] if result.output else ""
+            if tree.exists(result.serial):
+                tree.item(result.serial, values=(result.serial, result.state, duration, output))
+
+        def start():
+            serials = list(tree.selection())
+            if not serials:
+                summary_value.set("请至少选择一台设备")
+                return
+            if mode_value.get() == "install":
+                if not hap_value.get():
+                    summary_value.set("请选择要安装的 HAP 文件")
+                    return
+                build, succeeded = install_command(hap_value.get()), install_succeeded
+            else:
+                if not shell_value.get().strip():
+                    summary_value.set("请输入 shell 命令")
+                    return
+                build, succeeded = shell_command(shell_value.get().strip()), shell_succeeded
+            try:
+                parallelism, timeout = parallel_value.get(), timeout_value.get()
+            except tk.TclError:
+                summary_value.set("并发数和超时必须是数字")
+                return
+
+            start_button.config(state=tk.DISABLED)
+            summary_value.set(f"正在对 {len(serials)} 台设备执行...")
+            # 安装等长命令超时不代表 hdc 服务卡死，不经过看门狗，以免重启服务打断其他设备
+            fanout = FanOut(self.exec_routed_command, parallelism=parallelism, timeout=timeout,
+                            on_progress=lambda result: self.after(0, show_progress, result))
+            running.append(fanout)
+
+            def run():
+                fanout.run(serials, build, succeeded)
+                self.after(0, finish, fanout, fanout.summary())
+
+            threading.Thread(target=run, daemon=True).start()
+
+        def finish(fanout, summary):
+            running.remove(fanout)
+            if window.winfo_exists():
+                summary_value.set(summary)
+                start_button.config(state=tk.NORMAL)
+
+        def copy_report():
+            self.clipboard_clear()
+            self.clipboard_append(summary_value.get())
+            self.show_toast("报告已复制到剪贴板")
+
+        button_frame = tk.Frame(window)
+        button_frame.pack(fill='x', padx=10, pady=8)
+        start_button = ttk.Button(button_frame, text="开始", command=start, style='Rounded.TButton')
+        start_button.pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="复制报告", command=copy_report, style='Rounded.TButton').pack(side=tk.LEFT, padx=8)
+
+        def on_close():
+            # 尚未开始的设备不再执行，已开始的执行到结束或超时
+            for fanout in running:
+                fanout.cancel()
+            window.destroy()
+
+        window.protocol("WM_DELETE_WINDOW", on_close)
+
+    def show_tcp_discovery(self):
+        """网络设备发现窗口：探测地址段内开放 hdc 端口的设备并通过 tconn 连接"""
+        window = tk.Toplevel(self)
+        window.title("发现网络设备")
+        window.geometry("420x170")
+        window.resizable(False, False)
+
+        form = tk.Frame(window)
+        form.pack(fill='x', padx=16, pady=(16, 6))
+        form.columnconfigure(1, weight=1)
+        hosts_value = tk.StringVar(value=guess_local_network())
+        ports_value = tk.StringVar(value=DEFAULT_PORTS)
+        tk.Label(form, text="地址段", font=("Arial", 11)).grid(row=0, column=0, sticky='w', pady=4)
+        ttk.Entry(form, textvariable=hosts_value, font=("Arial", 11)).grid(row=0, column=1, sticky='ew', padx=(8, 0))
+        tk.Label(form, text="端口", font=("Arial", 11)).grid(row=1, column=0, sticky='w', pady=4)
+        ttk.Entry(form, textvariable=ports_value, font=("Arial", 11)).grid(row=1, column=1, sticky='ew', padx=(8, 0))
+
+        hint_value = tk.StringVar(value="例如 192.168.1.0/24 或 192.168.1.10-50，多段用逗号分隔")
+        tk.Label(window, textvariable=hint_value, font=("Arial", 9), fg="#888", anchor="w").pack(fill='x', padx=16)
+
+        def start_scan():
+            try:
+                hosts = parse_hosts(hosts_value.get())
+                ports = parse_ports(ports_value.get())
+            except ValueError as e:
+                hint_value.set(f"输入有误: {e}")
+                return
+            if not hosts or not ports:
+                hint_value.set("请填写地址段和端口")
+                return
+            self.status_value.set(f"正在扫描 {len(hosts)} 个地址...")
+            threading.Thread(target=self.discover_tcp_task, args=(hosts, ports), daemon=True).start()
+            window.destroy()
+
+        ttk.Button(window, text="扫描并连接", command=start_scan, style='Rounded.TButton').pack(pady=10)
+
+    def discover_tcp_task(self, hosts, ports):
+        endpoints = scan_endpoints(hosts, ports)
+        connected = []
+        if endpoints:
+            self.after(0, self.status_value.set, f"发现 {len(endpoints)} 个端点，正在连接...")
+            with ThreadPoolExecutor(max_workers=TCONN_WORKERS) as pool:
+                results = pool.map(lambda endpoint: self.run_hdc_command(["tconn", endpoint]), endpoints)
+                for endpoint, (stdout, _) in zip(endpoints, results):
+                    if tconn_succeeded(stdout):
+                        connected.append(endpoint)
+        self.after(0, self.on_tcp_discovery_done, connected)
+
+    def on_tcp_discovery_done(self, connected):
+        self.show_toast(f"已连接 {len(connected)} 台网络设备")
+        # 新连接的设备会出现在 list targets 中，走正常的 UDID 获取流程
+        self.refresh_devices()
+
+    def show_history(self):
+        """设备历史窗口：输入序列号或 UDID 前缀即时过滤"""
+        if self.history is None:
+            self.show_toast("设备历史不可用")
+            return
+
+        window = tk.Toplevel(self)
+        window.title("设备历史")
+        window.geometry("720x360")
+
+        search_value = tk.StringVar()
+        search_frame = tk.Frame(window)
+        search_frame.pack(fill='x', padx=10, pady=(10, 4))
+        tk.Label(search_frame, text="搜索", font=("Arial", 11)).pack(side=tk.LEFT)
+        search_entry = ttk.Entry(search_frame, textvariable=search_value, font=("Arial", 11))
+        search_entry.pack(side=tk.LEFT, fill='x', expand=True, padx=(8, 0))
+
+        columns = ("serial", "udid", "model", "first_seen", "last_seen")
+        headings = ("序列号", "UDID", "型号", "首次出现", "最近出现")
+        widths = (140, 260, 90, 110, 110)
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, heading, width in zip(columns, headings, widths):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor="w")
+        tree.pack(fill='both', expand=True, padx=10)
+
+        summary_value = tk.StringVar()
+        tk.Label(window, textvariable=summary_value, font=("Arial", 9), fg="#888", anchor="w").pack(fill='x', padx=10, pady=(2, 8))
+
+        def format_time(timestamp):
+            return strftime("%Y-%m-%d %H:%M", localtime(timestamp))
+
+        total = self.history.count()
+
+        pending_search = [None]
+
+        def show_results(text, rows):
+            # 窗口已关闭，或输入已变化（更新的检索结果随后到达）
+            if not window.winfo_exists() or text != search_value.get():
+                return
+            tree.delete(*tree.get_children())
+            for serial, udid, model, first_seen, last_seen in rows:
+                tree.insert("", tk.END, values=(serial, udid, model or "", format_time(first_seen), format_time(last_seen)))
+            summary_value.set(f"显示 {len(rows)} 条，共 {total} 条记录")
+
+        def start_search():
+            pending_search[0] = None
+            self.history.search_async(search_value.get(),
+                                      lambda text, rows: self.after(0, show_results, text, rows))
+
+        def refresh_results(*_):
+            # 连续输入时只检索最后一次，检索在后台线程中执行，不阻塞界面
+            if pending_search[0] is not None:
+                window.after_cancel(pending_search[0])
+            pending_search[0] = window.after(SEARCH_DEBOUNCE_MS, start_search)
+
+        def copy_selected_udid(event):
+            selection = tree.selection()
+            if selection:
+                self.clipboard_clear()
+                self.clipboard_append(tree.set(selection[0], "udid"))
+                self.show_toast("UDID 已复制到剪贴板")
+
+        search_value.trace_add("write", refresh_results)
+        tree.bind("<Double-1>", copy_selected_udid)
+        start_search()
+        search_entry.focus_set()
+
     def show_about(self):
         # 直接使用嵌入的版本信息
         version = APP_VERSION
@@ -434,6 +1172,80 @@ class HdcUdidApp(tk.Tk):
         link.bind("<Leave>", lambda e: link.config(fg="#0057ff"))  # 鼠标离开时恢复原色
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=APP_DESCRIPTION)
+    parser.add_argument("--record", metavar="FILE", help="录制所有 hdc 调用到会话文件")
+    parser.add_argument("--replay", metavar="FILE", help="回放会话文件，代替真实的 hdc")
+    parser.add_argument("--replay-speed", type=float, default=1.0, metavar="X",
+                        help="回放速度倍数，0 表示不等待（默认 1）")
+    parser.add_argument("--profile", nargs="?", const=strftime("profile-%Y%m%d-%H%M%S"), metavar="DIR",
+                        help="性能分析模式，退出时把报告写入 DIR")
+    parser.add_argument("--profile-memory", action="store_true", help="性能分析时记录每个刷新周期的内存分配增量")
+    parser.add_argument("--profile-top", type=int, default=25, metavar="N", help="报告中列出的函数数量（默认 25）")
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"],
+                        help="写入日志文件的级别（默认 info），日志位于 ~/.harmony-udid-tool/logs")
+    parser.add_argument("--no-log", action="store_true", help="关闭全部日志（含诊断窗口）")
+    parser.add_argument("--registered", metavar="FILE", help="启动时加载已注册设备列表（CSV/JSON）")
+    parser.add_argument("--hdc-shards", type=int, default=1, metavar="N",
+                        help="在 N 个本地端口上运行 hdc 服务并按设备分配（默认 1，即单个服务）")
+    parser.add_argument("--hdc-base-port", type=int, default=DEFAULT_SERVER_PORT, metavar="PORT",
+                        help=f"第一个 hdc 服务的端口，其余分片依次递增（默认 {DEFAULT_SERVER_PORT}）")
+    parser.add_argument("--standalone", action="store_true", help="不与同一主机上的其他实例共享设备信息，始终直接访问 hdc")
+    parser.add_argument("--shared-dir", metavar="DIR",
+                        help="与其他用户账户的实例共享设备信息时使用的目录（例如 /tmp/harmony-udid-tool），"
+                             "不存在时创建为带粘滞位的公共目录；只应与信任的账户共用（默认只协调本用户的实例）")
+    parser.add_argument("--lag-overlay", action="store_true", help="在状态栏显示界面事件循环延迟")
+    parser.add_argument("--stress", action="store_true", help="使用模拟 hdc 运行界面响应压力测试，p99 延迟超出预算时返回 1")
+    parser.add_argument("--stress-devices", type=int, default=300, metavar="N", help="压力测试模拟的设备数（默认 300）")
+    parser.add_argument("--stress-seconds", type=int, default=20, metavar="S", help="压力测试持续时间（默认 20 秒）")
+    parser.add_argument("--soak", action="store_true", help="通过模拟 hdc 可执行文件运行长时间浸泡测试，资源占用持续增长时返回 1")
+    parser.add_argument("--soak-cycles", type=int, default=5000, metavar="N", help="浸泡测试的循环次数（默认 5000）")
+    parser.add_argument("--soak-devices", type=int, default=50, metavar="N", help="浸泡测试模拟的设备数（默认 50）")
+    parser.add_argument("--lag-budget", type=int, default=50, metavar="MS", help="压力测试允许的 p99 延迟（默认 50ms）")
+    # 忽略未知参数，例如 macOS 启动时附带的 -psn_xxx
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
 if __name__ == "__main__":
-    app = HdcUdidApp()
-    app.mainloop()
+    args = parse_args()
+    setup_logging(os.path.join(DATA_DIR, "logs"), getattr(logging, args.log_level.upper()), enabled=not args.no_log)
+    recorder = SessionRecorder(args.record) if args.record else None
+    replayer = SessionReplayer(args.replay, args.replay_speed) if args.replay else None
+    if args.stress:
+        app = HdcUdidApp(replayer=FakeHdc(devices=args.stress_devices), keep_history=False)
+        monitor = app.start_lag_monitor(overlay=True)
+        scenario = StressScenario(app, monitor, devices=args.stress_devices,
+                                  seconds=args.stress_seconds, budget_ms=args.lag_budget)
+        scenario.start()
+        app.mainloop()
+        sys.exit(0 if scenario.passed else 1)
+    elif args.soak:
+        # 模拟 hdc 是真实的可执行文件，启动、管道读取、超时和子进程回收都走正常代码路径
+        fake_hdc_dir = tempfile.mkdtemp(prefix="hdc-soak-")
+        fake_hdc = write_fake_hdc_launcher(fake_hdc_dir, devices=args.soak_devices, latency=0.01)
+        app = HdcUdidApp(hdc_path=fake_hdc, keep_history=False, coordinate=False)
+        scenario = SoakScenario(app, cycles=args.soak_cycles)
+        scenario.start()
+        app.mainloop()
+        shutil.rmtree(fake_hdc_dir, ignore_errors=True)
+        sys.exit(0 if scenario.passed else 1)
+    elif args.profile:
+        profiler = AppProfiler(args.profile, trace_memory=args.profile_memory, top=args.profile_top)
+        profiler.patch(HdcUdidApp, ["refresh_devices", "fetch_devices_task", "fetch_udid_task",
+                                    "update_device_list", "update_udid_display"])
+        profiler.start()
+        app = profiler.run("startup", HdcUdidApp, recorder=recorder, replayer=replayer, profiler=profiler,
+                           registered_path=args.registered, coordinate=not args.standalone,
+                           shared_dir=args.shared_dir, hdc_shards=args.hdc_shards, hdc_base_port=args.hdc_base_port)
+        # 事件循环延迟反映 Tk 重绘和回调占用主线程的时间
+        profiler.lag_monitor = app.start_lag_monitor(overlay=args.lag_overlay)
+        app.mainloop()
+        print(f"性能分析报告已写入: {profiler.dump()}")
+    else:
+        app = HdcUdidApp(recorder=recorder, replayer=replayer, registered_path=args.registered,
+                         coordinate=not args.standalone, shared_dir=args.shared_dir,
+                         hdc_shards=args.hdc_shards, hdc_base_port=args.hdc_base_port)
+        if args.lag_overlay:
+            app.start_lag_monitor(overlay=True)
+        app.mainloop()
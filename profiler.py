@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+性能分析模块
+--profile 模式下用 cProfile 包裹启动、刷新设备和获取 UDID 等热点路径，
+同时以固定间隔采样所有线程的调用栈，退出时输出：
+- <路径名>.pstats       各热点路径的 cProfile 统计，可用 pstats/snakeviz 查看
+- stacks.collapsed     折叠调用栈，可直接用 flamegraph.pl / speedscope 生成火焰图
+- summary.txt          各路径 Top-N 函数、Python / 子进程 / Tk 的耗时划分、各线程的采样划分
+                       （主线程中停留在 mainloop 的时间即 Tk 空闲等待与重绘），以及事件循环延迟
+- memory.txt           每次刷新周期之间的内存分配增量（需 --profile-memory）
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# 调用栈采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+
+def _is_subprocess_file(filename):
+    return filename.endswith(("/subprocess.py", "/selectors.py", "/hdc_stream.py"))
+
+
+def _classify(func_key, caller_keys=()):
+    """按函数所在模块把耗时划分为 Tk / 子进程 / Python 三类
+
+    内置函数（如 TextIOWrapper.readline、Lock.acquire）没有所在文件，按调用方归类：
+    hdc_stream / subprocess 中读取管道、等待子进程的时间算作子进程耗时。
+    """
+    filename, _, name = func_key
+    filename = filename.replace("\\", "/")
+    if "/tkinter/" in filename or "_tkinter" in name:
+        return "Tk"
+    if (_is_subprocess_file(filename) or "_posixsubprocess" in name
+            or "waitpid" in name or "WaitForSingleObject" in name or "CreateProcess" in name):
+        return "子进程"
+    if filename == "~":
+        for caller_filename, _, _ in caller_keys:
+            caller_filename = caller_filename.replace("\\", "/")
+            if _is_subprocess_file(caller_filename):
+                return "子进程"
+            if "/tkinter/" in caller_filename:
+                return "Tk"
+    return "Python"
+
+
+def _classify_leaf(thread_name, code):
+    """调用栈采样：按最内层 Python 帧归类；主线程停在 mainloop 说明正在 Tk 的 C 代码中（空闲等待或重绘）。
+    hdc_stream 为每个子进程创建的 stderr 读取和超时线程只在等待子进程"""
+    if thread_name.startswith("hdc-"):
+        return "子进程"
+    filename = code.co_filename.replace("\\", "/")
+    if "/tkinter/" in filename and code.co_name == "mainloop":
+        return "Tk 事件循环（空闲/重绘）"
+    return _classify((filename, 0, code.co_name))
+
+
+class StackSampler(threading.Thread):
+    """定时采样所有线程的调用栈，生成折叠格式（collapsed stacks）"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.categories = Counter()   # (线程名, 类别) -> 采样次数
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                thread_name = names.get(thread_id, str(thread_id))
+                self.categories[(thread_name, _classify_leaf(thread_name, frame.f_code))] += 1
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_name)
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(1.0)
+
+
+class AppProfiler:
+    """收集各热点路径的 cProfile 数据，并在退出时写出报告
+
+    同一时间只运行一个 cProfile 会话：Python 3.12 起 cProfile 基于 sys.monitoring，
+    同时启用第二个会话会抛出 ValueError。与其他路径并发的调用照常执行但不做 cProfile 统计，
+    只计入调用栈采样，报告中注明未统计的次数。
+    """
+
+    def __init__(self, output_dir, trace_memory=False, top=25):
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.top = top
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}    # 路径名 -> pstats.Stats
+        self._calls = Counter()
+        self._skipped = Counter()   # 因并发未做 cProfile 统计的调用次数
+        self._session_lock = threading.Lock()
+        self.lag_monitor = None
+        self._memory_reports = []
+        self._last_snapshot = None
+        self._sampler = StackSampler()
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start(10)
+            self._last_snapshot = tracemalloc.take_snapshot()
+        self._sampler.start()
+
+    def run(self, name, func, *args, **kwargs):
+        """在 cProfile 下执行 func；同一线程内嵌套调用时只由最外层统计，其他线程已有会话时不统计"""
+        if getattr(self._local, "active", False):
+            return func(*args, **kwargs)
+        if not self._session_lock.acquire(blocking=False):
+            with self._lock:
+                self._skipped[name] += 1
+            return func(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        self._local.active = True
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self._local.active = False
+            self._session_lock.release()
+            with self._lock:
+                self._calls[name] += 1
+                if name in self._stats:
+                    self._stats[name].add(profile)
+                else:
+                    self._stats[name] = pstats.Stats(profile)
+
+    def patch(self, cls, method_names):
+        """替换类上的方法，使每次调用都经过 run()；需在创建实例之前调用"""
+        for method_name in method_names:
+            setattr(cls, method_name, self._wrap(method_name, getattr(cls, method_name)))
+
+    def _wrap(self, name, original):
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            return self.run(name, original, *args, **kwargs)
+        return wrapper
+
+    def snapshot_memory(self, label):
+        """记录与上一次快照之间的内存分配增量（每个刷新周期调用一次）"""
+        if not self.trace_memory:
+            return
+        snapshot = tracemalloc.take_snapshot()
+        diff = snapshot.compare_to(self._last_snapshot, "lineno")
+        self._last_snapshot = snapshot
+        total = sum(stat.size_diff for stat in diff)
+        lines = [f"[{time.strftime('%H:%M:%S')}] {label}: 净增 {total / 1024:.1f} KiB"]
+        lines.extend(f"    {stat}" for stat in diff[:self.top // 2 or 1])
+        with self._lock:
+            self._memory_reports.append("\n".join(lines))
+
+    def dump(self):
+        """停止采样并写出全部报告，返回输出目录"""
+        self._sampler.stop()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        with self._lock:
+            stats = dict(self._stats)
+            calls = dict(self._calls)
+            skipped = dict(self._skipped)
+            memory_reports = list(self._memory_reports)
+
+        summary = io.StringIO()
+        for name, stat in stats.items():
+            stat.dump_stats(os.path.join(self.output_dir, f"{name}.pstats"))
+            note = f"，另有 {skipped[name]} 次与其他路径并发未统计" if skipped.get(name) else ""
+            summary.write(f"===== {name}（{calls[name]} 次{note}）=====\n")
+            summary.write(self._format_breakdown(stat))
+            stat.stream = summary
+            stat.sort_stats("cumulative").print_stats(self.top)
+        summary.write(self._format_thread_breakdown())
+        if self.lag_monitor is not None:
+            summary.write("\n===== 事件循环延迟（Tk 重绘与回调占用主线程的时间）=====\n")
+            summary.write(self.lag_monitor.summary() + "\n")
+            summary.write(self.lag_monitor.format_histogram() + "\n")
+
+        with open(os.path.join(self.output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+        with open(os.path.join(self.output_dir, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in self._sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        if self.trace_memory:
+            tracemalloc.stop()
+            with open(os.path.join(self.output_dir, "memory.txt"), "w", encoding="utf-8") as f:
+                f.write("\n\n".join(memory_reports) + "\n")
+
+        return self.output_dir
+
+    def _format_thread_breakdown(self):
+        """各线程的调用栈采样划分"""
+        by_thread = {}
+        for (thread_name, category), count in self._sampler.categories.items():
+            by_thread.setdefault(thread_name, Counter())[category] += count
+        lines = ["\n===== 调用栈采样划分（每次采样间隔 "
+                 f"{self._sampler.interval * 1000:.0f}ms）=====\n"]
+        # 主线程在前，其余按采样次数排序
+        order = sorted(by_thread, key=lambda name: (name != "MainThread", -sum(by_thread[name].values())))
+        for thread_name in order:
+            counts = by_thread[thread_name]
+            total = sum(counts.values())
+            parts = [f"{category} {count / total:.0%}" for category, count in counts.most_common()]
+            lines.append(f"{thread_name}（{total} 次）: " + "，".join(parts) + "\n")
+        return "".join(lines)
+
+    def _format_breakdown(self, stat):
+        totals = Counter()
+        for func_key, (_, _, own_time, _, callers) in stat.stats.items():
+            totals[_classify(func_key, callers)] += own_time
+        overall = sum(totals.values()) or 1.0
+        parts = [f"{category} {seconds:.3f}s ({seconds / overall:.0%})" for category, seconds in totals.most_common()]
+        return "耗时划分: " + "，".join(parts) + "\n"
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+已注册设备比对模块
+加载导出的已注册设备列表（CSV / JSON），在内存中建立 UDID 哈希索引，
+用于判断连接的设备是否已加入调试证书（Profile）。
+
+支持的文件格式:
+- CSV：表头中含 "udid" 的列（不区分大小写），没有表头时取第一列（第一行必须像 UDID）
+- JSON：UDID 字符串数组、含 udid 字段的对象数组，或 {"devices": [...]} 形式
+其他结构（找不到 UDID 列或字段）抛出 ValueError，不会当作空列表加载。
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+
+# 可识别为 UDID 的字段名（小写）
+UDID_KEYS = ("udid", "devicekey", "device_udid", "deviceudid")
+
+
+# 没有表头的 CSV 第一格至少要这么长且只含字母、数字和连字符，才当作 UDID
+MIN_UDID_LENGTH = 20
+
+
+def normalize_udid(udid):
+    return (udid or "").strip().upper()
+
+
+def looks_like_udid(value):
+    value = normalize_udid(value)
+    return len(value) >= MIN_UDID_LENGTH and value.replace("-", "").isalnum()
+
+
+def _udids_from_csv(text):
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((index for index, name in enumerate(header) if name in UDID_KEYS), None)
+    if column is None:
+        column = next((index for index, name in enumerate(header) if "udid" in name), None)
+    if column is None:
+        # 无表头，取第一列；第一行不像 UDID 说明是缺少 UDID 列的表头
+        if not rows[0] or not looks_like_udid(rows[0][0]):
+            raise ValueError(f"无法解析已注册设备列表: CSV 表头中没有 UDID 列 ({', '.join(rows[0])})")
+        column, data = 0, rows
+    else:
+        data = rows[1:]
+    return [row[column] for row in data if len(row) > column]
+
+
+def _udids_from_json(data):
+    if isinstance(data, dict):
+        for key in ("devices", "deviceList", "data", "list"):
+            if key in data:
+                return _udids_from_json(data[key])
+        raise ValueError(f"无法解析已注册设备列表: JSON 对象中没有设备列表字段 ({', '.join(map(str, data)) or '空对象'})")
+    if not isinstance(data, list):
+        raise ValueError(f"无法解析已注册设备列表: 不支持的 JSON 结构 ({type(data).__name__})")
+    udids = []
+    for item in data:
+        if isinstance(item, str):
+            udids.append(item)
+        elif isinstance(item, dict):
+            for key, value in item.items():
+                if key.lower() in UDID_KEYS and isinstance(value, str):
+                    udids.append(value)
+                    break
+    if data and not udids:
+        raise ValueError("无法解析已注册设备列表: JSON 数组中没有 UDID 字符串或 udid 字段")
+    return udids
+
+
+def parse_registered_devices(content, path=""):
+    """解析文件内容（bytes），返回 UDID 集合"""
+    text = content.decode("utf-8-sig")
+    stripped = text.lstrip()
+    if path.lower().endswith(".json") or stripped.startswith(("[", "{")):
+        udids = _udids_from_json(json.loads(text))
+    else:
+        udids = _udids_from_csv(text)
+    return {udid for udid in map(normalize_udid, udids) if udid}
+
+
+class RegisteredDevices:
+    """已注册设备索引：查询为 O(1)，文件变化时按修改时间和内容哈希增量重新加载"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.udids = frozenset()
+        self._mtime = None
+        self._digest = None
+        self._lock = threading.Lock()
+        if path:
+            self.load(path)
+
+    @property
+    def loaded(self):
+        return self.path is not None
+
+    def load(self, path):
+        """加载新的列表文件，格式错误时抛出 ValueError，原有列表保持不变"""
+        with self._lock:
+            mtime, digest, udids = self._read(path)
+            self.path = path
+            self._mtime = mtime
+            self._digest = digest
+            self.udids = frozenset(udids)
+
+    def reload_if_changed(self):
+        """文件修改时间变化且内容哈希不同时才重新解析，返回是否更新了索引"""
+        if self.path is None:
+            return False
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return False
+            if mtime == self._mtime:
+                return False
+            mtime, digest, udids = self._read(self.path, self._digest)
+            self._mtime = mtime
+            if udids is None:
+                return False
+            self._digest = digest
+            # 整体替换集合，读取方无需加锁
+            self.udids = frozenset(udids)
+            return True
+
+    def contains(self, udid):
+        return normalize_udid(udid) in self.udids
+
+    @staticmethod
+    def _read(path, known_digest=None):
+        """读取并解析文件，返回 (mtime, digest, UDID 集合)；内容哈希等于 known_digest 时集合为 None"""
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if digest == known_digest:
+            return stat.st_mtime_ns, digest, None
+        try:
+            udids = parse_registered_devices(content, path)
+        except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+            raise ValueError(f"无法解析已注册设备列表: {e}")
+        return stat.st_mtime_ns, digest, udids
+
+
+def export_new_devices(path, devices):
+    """导出未注册设备，devices 为 (序列号, UDID) 列表"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["serial", "udid"])
+        writer.writerows(devices)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+长时间运行（浸泡）测试模块
+使用模拟 hdc 可执行文件反复刷新设备、选择设备并复制 UDID（每次 hdc 调用都是真实的子进程），
+定期采样进程 RSS、线程数、打开的文件描述符、子进程数以及 Tk 控件和图片数量；预热之后某项指标持续单调增长即判定为泄漏。
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+import tkinter as tk
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 每隔多少次循环采样一次
+SAMPLE_EVERY = 50
+# 预热循环数：缓存填满、线程池启动完成之前的样本不参与判定
+WARMUP_CYCLES = 200
+# 结束前等待后台线程和提示框结束的时间（毫秒）
+SETTLE_MS = 3000
+
+# 增长判定：把预热后的样本按时间分成若干段，各段中位数严格递增且首尾差超过容差才算泄漏
+SEGMENTS = 4
+TOLERANCE = {
+    "rss_kb": 8 * 1024,
+    "threads": 2,
+    "fds": 4,
+    "children": 1,
+    "widgets": 5,
+    "images": 1,
+}
+
+METRIC_NAMES = {
+    "rss_kb": "内存 RSS (KB)",
+    "threads": "线程数",
+    "fds": "文件描述符",
+    "children": "子进程",
+    "widgets": "Tk 控件",
+    "images": "Tk 图片",
+}
+
+
+def read_rss_kb():
+    """当前进程的常驻内存（KB），无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    # 非 Linux 只能拿到峰值内存，macOS 单位为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def count_fds():
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    return None
+
+
+def count_children():
+    """直接子进程数量（读取 /proc），其他平台返回 None"""
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    parent = os.getpid()
+    children = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as stat:
+                # 进程名可能包含空格，ppid 在最后一个 ')' 之后的第二个字段
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == parent:
+            children += 1
+    return children
+
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+def sample_resources(root):
+    """采样一次资源占用，返回 {指标: 数值}，取不到的指标为 None"""
+    return {
+        "rss_kb": read_rss_kb(),
+        "threads": threading.active_count(),
+        "fds": count_fds(),
+        "children": count_children(),
+        "widgets": count_widgets(root),
+        "images": len(root.image_names()),
+    }
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def find_growth(samples, segments=SEGMENTS, tolerance=TOLERANCE):
+    """返回持续增长的指标 [(指标, 首段中位数, 末段中位数)]；样本太少时不做判定"""
+    if len(samples) < segments * 2:
+        return []
+    size = len(samples) // segments
+    growing = []
+    for metric, limit in tolerance.items():
+        values = [sample[metric] for sample in samples if sample.get(metric) is not None]
+        if len(values) < len(samples):
+            continue
+        medians = [_median(values[index * size:(index + 1) * size]) for index in range(segments)]
+        increasing = all(later > earlier for earlier, later in zip(medians, medians[1:]))
+        if increasing and medians[-1] - medians[0] > limit:
+            growing.append((metric, medians[0], medians[-1]))
+    return growing
+
+
+class SoakScenario:
+    """浸泡场景：在 UI 线程中按固定间隔执行一个循环（刷新 / 选择设备 / 复制 UDID）
+
+    app 的 hdc 路径应指向 write_fake_hdc_launcher 生成的模拟 hdc，子进程启动、管道读取和回收都走真实代码；
+    所有操作都走与用户点击相同的方法。
+    """
+
+    def __init__(self, app, cycles=5000, interval_ms=20, seed=0):
+        self.app = app
+        self.cycles = cycles
+        self.interval_ms = interval_ms
+        self.samples = []   # [(循环次数, 样本)]
+        self.passed = None
+        self.growth = []
+        self._cycle = 0
+        self._started = None
+        self._random = random.Random(seed)
+
+    def start(self):
+        self._started = time.monotonic()
+        self.app.after(0, self._step)
+
+    def _step(self):
+        self._cycle += 1
+        if self._cycle % 10 == 1:
+            # 上一次刷新尚未完成时跳过，避免堆积刷新线程
+            if str(self.app.refresh_button["state"]) != tk.DISABLED:
+                self.app.refresh_devices()
+        else:
+            self._select_random_device()
+        if self._cycle % SAMPLE_EVERY == 0:
+            self.samples.append((self._cycle, sample_resources(self.app)))
+        if self._cycle % 1000 == 0:
+            print(f"浸泡测试: {self._cycle}/{self.cycles} 次循环，{time.monotonic() - self._started:.0f}s")
+        if self._cycle < self.cycles:
+            self.app.after(self.interval_ms, self._step)
+        else:
+            self.app.after(SETTLE_MS, self._finish)
+
+    def _select_random_device(self):
+        names = self.app.device_combobox["values"]
+        if not names:
+            return
+        self.app.device_combobox.set(self._random.choice(names))
+        self.app.on_device_select(None)
+        if self._cycle % 5 == 0:
+            # 复制会弹出提示框（Toplevel），检查提示框是否被销毁
+            self.app.copy_udid()
+
+    def _finish(self):
+        final = sample_resources(self.app)
+        measured = [sample for cycle, sample in self.samples if cycle > WARMUP_CYCLES] + [final]
+        self.growth = find_growth(measured)
+        self.passed = not self.growth
+        print(f"浸泡测试: {self._cycle} 次循环，耗时 {time.monotonic() - self._started:.0f}s，采样 {len(self.samples)} 次")
+        print(self.format_report(final))
+        for metric, first, last in self.growth:
+            print(f"  持续增长: {METRIC_NAMES[metric]} {first} -> {last}")
+        print(f"结果: {'通过' if self.passed else '失败'}")
+        self.app.on_exit()
+
+    def format_report(self, final):
+        lines = [f"{'指标':<16}{'预热后':>12}{'最小':>12}{'最大':>12}{'结束':>12}"]
+        measured = [sample for cycle, sample in self.samples if cycle > WARMUP_CYCLES] or [final]
+        for metric, name in METRIC_NAMES.items():
+            values = [sample[metric] for sample in measured if sample[metric] is not None]
+            if not values or final[metric] is None:
+                lines.append(f"{name:<16}{'不支持':>12}")
+                continue
+            lines.append(f"{name:<16}{values[0]:>12}{min(values):>12}{max(values):>12}{final[metric]:>12}")
+        return "\n".join(lines)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+网络设备发现模块
+并发探测指定地址段和端口上的 hdc 监听端口，供 `hdc tconn` 连接网络设备使用。
+
+地址写法（可用逗号分隔多段）:
+    192.168.1.0/24        网段
+    192.168.1.10-50       同一网段内的地址区间
+    192.168.1.10-192.168.1.80
+    192.168.1.23          单个地址
+
+自检：`python tcp_discovery.py` 在本机临时端口上开启监听，验证地址解析与端口探测。
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import socket
+import sys
+
+# 设备端 hdc 默认的 TCP 端口（hdc tmode port 5555）
+DEFAULT_PORTS = "5555"
+
+# 单次连接超时（秒）与最大并发连接数（macOS 默认文件句柄上限为 256）
+CONNECT_TIMEOUT = 0.4
+MAX_CONCURRENCY = 200
+
+# 单次扫描的地址数上限，防止误填过大的网段
+MAX_HOSTS = 4096
+
+# hdc tconn 的输出：连接成功，或该设备此前已连接
+TCONN_OK = ("connect ok", "target is connected")
+
+
+def parse_hosts(spec):
+    """解析地址段，返回去重后保持顺序的 IP 字符串列表；格式错误或地址过多时抛出 ValueError。
+    在生成地址之前先按数量检查，过大的网段（如 10.0.0.0/8、fe80::/64）立即被拒绝"""
+    hosts = []
+    for part in spec.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "/" in part:
+            network = ipaddress.ip_network(part, strict=False)
+            _check_count(len(hosts) + network.num_addresses)
+            addresses = list(network.hosts()) or [network.network_address]
+        elif "-" in part:
+            start_text, end_text = (text.strip() for text in part.split("-", 1))
+            start = ipaddress.ip_address(start_text)
+            if "." in end_text or ":" in end_text:
+                end = ipaddress.ip_address(end_text)
+            else:
+                # 192.168.1.10-50 这种只写最后一段的写法
+                end = ipaddress.ip_address(start_text.rsplit(".", 1)[0] + "." + end_text)
+            if end.version != start.version or end < start:
+                raise ValueError(f"地址区间无效: {part}")
+            _check_count(len(hosts) + int(end) - int(start) + 1)
+            addresses = [ipaddress.ip_address(value) for value in range(int(start), int(end) + 1)]
+        else:
+            addresses = [ipaddress.ip_address(part)]
+        hosts.extend(str(address) for address in addresses)
+        _check_count(len(hosts))
+    return list(dict.fromkeys(hosts))
+
+
+def _check_count(count):
+    if count > MAX_HOSTS:
+        raise ValueError(f"地址过多（超过 {MAX_HOSTS} 个），请缩小范围")
+
+
+def parse_ports(spec):
+    """解析端口列表，例如 "5555,8710" 或 "5555-5560" """
+    ports = []
+    for part in spec.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (int(text) for text in part.split("-", 1))
+            ports.extend(range(start, end + 1))
+        else:
+            ports.append(int(part))
+    for port in ports:
+        if not 0 < port < 65536:
+            raise ValueError(f"端口无效: {port}")
+    return list(dict.fromkeys(ports))
+
+
+def guess_local_network():
+    """根据本机出口地址猜测所在的 /24 网段，失败时返回空字符串"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            # UDP connect 不会真正发包，只用于确定出口网卡地址
+            sock.connect(("10.255.255.255", 1))
+            address = sock.getsockname()[0]
+    except OSError:
+        return ""
+    if address.startswith("127."):
+        return ""
+    return str(ipaddress.ip_network(f"{address}/24", strict=False))
+
+
+def format_endpoint(host, port):
+    if ":" in host:
+        return f"[{host}]:{port}"
+    return f"{host}:{port}"
+
+
+async def _probe(host, port, timeout, semaphore):
+    async with semaphore:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return format_endpoint(host, port)
+
+
+async def _scan(hosts, ports, timeout, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [_probe(host, port, timeout, semaphore) for host in hosts for port in ports]
+    results = await asyncio.gather(*tasks)
+    return [endpoint for endpoint in results if endpoint]
+
+
+def scan_endpoints(hosts, ports, timeout=CONNECT_TIMEOUT, concurrency=MAX_CONCURRENCY):
+    """并发探测所有 host:port，返回可连接的端点列表（"ip:port"），在调用线程中阻塞执行"""
+    if not hosts or not ports:
+        return []
+    return asyncio.run(_scan(hosts, ports, timeout, concurrency))
+
+
+def tconn_succeeded(stdout):
+    """hdc tconn 是否连接成功；失败时输出 `[Fail]...`，不能只查找 "ok"（例如 "token"）"""
+    if not stdout:
+        return False
+    text = stdout.strip().lower()
+    return not text.startswith("[fail]") and any(marker in text for marker in TCONN_OK)
+
+
+# --- 自检 ---
+
+def _free_port():
+    """取得一个当前没有监听的本机端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_self_test(listeners=3, closed=3):
+    """在 127.0.0.1 的临时端口上开启 listeners 个监听，另取 closed 个未监听端口，
+    检查 scan_endpoints 只返回监听中的端点，并检查 parse_hosts / parse_ports / tconn_succeeded。返回是否全部通过"""
+    failures = []
+
+    def check(name, actual, expected):
+        passed = actual == expected
+        print(f"  {'通过' if passed else '失败'}  {name}")
+        if not passed:
+            print(f"        期望 {expected!r}\n        实际 {actual!r}")
+            failures.append(name)
+
+    print("地址解析")
+    check("网段", parse_hosts("10.0.0.0/30"), ["10.0.0.1", "10.0.0.2"])
+    check("单个 /32", parse_hosts("10.0.0.9/32"), ["10.0.0.9"])
+    check("末段区间", parse_hosts("192.168.1.10-12"), ["192.168.1.10", "192.168.1.11", "192.168.1.12"])
+    check("完整区间", parse_hosts("192.168.1.254-192.168.2.1"),
+          ["192.168.1.254", "192.168.1.255", "192.168.2.0", "192.168.2.1"])
+    check("多段去重", parse_hosts("127.0.0.1，127.0.0.1, 127.0.0.2"), ["127.0.0.1", "127.0.0.2"])
+    for spec in ("192.168.1.50-10", "10.0.0.0/8", "fe80::/64", "10.0.0.1-10.255.255.255", "not-an-ip"):
+        try:
+            parse_hosts(spec)
+            check(f"拒绝 {spec}", "未抛出", "ValueError")
+        except ValueError:
+            check(f"拒绝 {spec}", "ValueError", "ValueError")
+    check("端口区间", parse_ports("5555-5557,8710"), [5555, 5556, 5557, 8710])
+
+    print("tconn 输出")
+    check("Connect OK", tconn_succeeded("Connect OK\n"), True)
+    check("已连接", tconn_succeeded("[Info]Target is connected, repeat operation"), True)
+    check("失败", tconn_succeeded("[Fail]Connect failed"), False)
+    check("含 ok 的错误", tconn_succeeded("[Fail]Invalid token"), False)
+
+    print("端口探测")
+    servers = []
+    try:
+        for _ in range(listeners):
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.bind(("127.0.0.1", 0))
+            server.listen()
+            servers.append(server)
+        open_ports = [server.getsockname()[1] for server in servers]
+        closed_ports = [_free_port() for _ in range(closed)]
+        found = scan_endpoints(["127.0.0.1"], open_ports + closed_ports, timeout=1.0)
+        check(f"{listeners} 个监听 + {closed} 个未监听端口", sorted(found),
+              sorted(format_endpoint("127.0.0.1", port) for port in open_ports))
+        check("多个地址", sorted(scan_endpoints(parse_hosts("127.0.0.1-2"), open_ports[:1], timeout=1.0)),
+              [format_endpoint("127.0.0.1", open_ports[0])])
+        check("空地址列表", scan_endpoints([], open_ports), [])
+    finally:
+        for server in servers:
+            server.close()
+
+    print(f"结果: {'通过' if not failures else f'{len(failures)} 项失败'}")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="网络设备发现自检（在本机临时端口上监听并探测）")
+    parser.add_argument("--listeners", type=int, default=3)
+    parser.add_argument("--closed", type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(0 if run_self_test(listeners=args.listeners, closed=args.closed) else 1)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+UDID 获取调度模块
+刷新设备列表后在后台低优先级预取所有设备的 UDID；用户选择设备时的请求由专用线程立即处理，
+且有用户请求在执行时不再开始新的预取，保证预取不会拖慢用户正在查看的设备。
+获取型号等附带查询作为后台任务与预取共用线程，同样给用户请求让路。
+"""
+
+import itertools
+import queue
+import threading
+
+from app_logging import logger
+
+# 后台预取线程数
+PREFETCH_WORKERS = 2
+
+_STOP = object()
+
+
+class UdidScheduler:
+    """fetch(serial) 返回 (udid, status, 是否成功)；结果通过 on_result(serial, udid, status, 是否成功) 回调
+
+    is_resolved(serial) 为 True 的设备（已获取过 UDID）直接跳过，不再访问 hdc；
+    失败的设备下次选择或刷新时重试。
+    """
+
+    def __init__(self, fetch, on_result, is_resolved, prefetch_workers=PREFETCH_WORKERS):
+        self.fetch = fetch
+        self.on_result = on_result
+        self.is_resolved = is_resolved
+        self._lock = threading.Lock()
+        self._in_flight = set()   # 正在获取的序列号
+        self._queued = set()      # 已在预取队列中的序列号，避免每次刷新重复排队
+        self._online = set()      # 最近一次设备列表，已离线的序列号出队时直接丢弃
+        self._seq = itertools.count()
+        # 用户请求：最新的选择最先处理
+        self._user_queue = queue.PriorityQueue()
+        self._prefetch_queue = queue.Queue()
+        self._user_idle = threading.Event()
+        self._user_idle.set()
+        self._threads = [threading.Thread(target=self._user_loop, name="udid-user", daemon=True)]
+        self._threads.extend(threading.Thread(target=self._prefetch_loop, name=f"udid-prefetch-{index}", daemon=True)
+                             for index in range(prefetch_workers))
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, serial):
+        """用户选择设备：插队到最前，由专用线程处理"""
+        self._user_idle.clear()
+        self._user_queue.put((-next(self._seq), serial))
+
+    def prefetch(self, serials):
+        """设备列表更新：为尚未获取 UDID、也不在队列中的设备排队预取"""
+        with self._lock:
+            self._online = set(serials)
+            pending = [serial for serial in serials
+                       if serial not in self._queued and serial not in self._in_flight and not self.is_resolved(serial)]
+            self._queued.update(pending)
+        for serial in pending:
+            self._prefetch_queue.put(serial)
+
+    def background(self, task):
+        """低优先级后台任务（例如获取 UDID 后查询型号），由预取线程在没有用户请求时执行"""
+        self._prefetch_queue.put(task)
+
+    def stop(self):
+        self._user_queue.put((float("inf"), _STOP))
+        for _ in self._threads[1:]:
+            self._prefetch_queue.put(_STOP)
+        self._user_idle.set()
+
+    def _user_loop(self):
+        while True:
+            _, serial = self._user_queue.get()
+            if serial is _STOP:
+                return
+            self._run(serial, user_requested=True)
+            if self._user_queue.empty():
+                self._user_idle.set()
+
+    def _prefetch_loop(self):
+        while True:
+            serial = self._prefetch_queue.get()
+            if serial is _STOP:
+                return
+            if callable(serial):
+                self._user_idle.wait()
+                try:
+                    serial()
+                except Exception as e:
+                    logger.warning("Background task failed: %s", e)
+                continue
+            with self._lock:
+                self._queued.discard(serial)
+                if serial not in self._online:
+                    continue
+            # 有用户请求在执行或排队时先让路
+            self._user_idle.wait()
+            self._run(serial, user_requested=False)
+
+    def _run(self, serial, user_requested):
+        if self.is_resolved(serial):
+            return
+        with self._lock:
+            if serial in self._in_flight:
+                # 已在获取中（例如预取），完成后 on_result 会通知
+                return
+            self._in_flight.add(serial)
+
+        try:
+            udid, status, resolved = self.fetch(serial)
+        except Exception as e:
+            udid, status, resolved = "获取UDID失败", f"错误: {e}", False
+        with self._lock:
+            self._in_flight.discard(serial)
+        self.on_result(serial, udid, status, resolved)
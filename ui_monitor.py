@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+界面响应监测模块
+LagMonitor 用 after() 定时心跳测量 Tk 事件循环的调度延迟，按毫秒分桶统计直方图；
+StressScenario 用模拟 hdc 制造大量设备插拔和 UDID 返回，检查 p99 延迟是否超出预算。
+
+使用方法:
+    python main.py --lag-overlay                   # 状态栏右侧显示实时延迟
+    python main.py --stress [--stress-devices 300] [--stress-seconds 20] [--lag-budget 50]
+"""
+
+import random
+import threading
+import time
+from collections import Counter
+
+# 心跳间隔（毫秒）
+HEARTBEAT_MS = 20
+
+# 延迟浮层刷新间隔（毫秒）
+OVERLAY_REFRESH_MS = 500
+
+
+class LagMonitor:
+    """Tk 事件循环延迟监测：延迟 = 心跳实际间隔 - 预期间隔"""
+
+    def __init__(self, widget, interval_ms=HEARTBEAT_MS):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.histogram = Counter()  # 延迟毫秒数 -> 次数
+        self.samples = 0
+        self.max_lag_ms = 0
+        self._expected = None
+        self._after_id = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def reset(self):
+        self.histogram.clear()
+        self.samples = 0
+        self.max_lag_ms = 0
+
+    def _tick(self):
+        now = time.perf_counter()
+        lag_ms = max(0, int((now - self._expected) * 1000))
+        self.histogram[lag_ms] += 1
+        self.samples += 1
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        self._expected = now + self.interval_ms / 1000
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def percentile(self, percent):
+        """按直方图估算百分位延迟（毫秒）"""
+        if not self.samples:
+            return 0
+        threshold = self.samples * percent / 100
+        seen = 0
+        for lag_ms in sorted(self.histogram):
+            seen += self.histogram[lag_ms]
+            if seen >= threshold:
+                return lag_ms
+        return self.max_lag_ms
+
+    def summary(self):
+        return f"UI 延迟 p50 {self.percentile(50)}ms / p99 {self.percentile(99)}ms / 最大 {self.max_lag_ms}ms"
+
+    def format_histogram(self):
+        """按 0/1/2/5/10/20/50/100/200/500ms 分档输出直方图文本"""
+        edges = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+        buckets = Counter()
+        for lag_ms, count in self.histogram.items():
+            label = next((edge for edge in reversed(edges) if lag_ms >= edge), 0)
+            buckets[label] += count
+        lines = []
+        for index, edge in enumerate(edges):
+            upper = f"{edges[index + 1]}ms" if index + 1 < len(edges) else "以上"
+            count = buckets[edge]
+            bar = "#" * (count * 40 // self.samples) if self.samples else ""
+            lines.append(f"  {edge:>4}ms-{upper:<6} {count:7d} {bar}")
+        return "\n".join(lines)
+
+    def attach_overlay(self, label):
+        """定时把延迟摘要显示在 label 上（调试浮层）"""
+        def refresh():
+            label.config(text=self.summary())
+            label.after(OVERLAY_REFRESH_MS, refresh)
+        refresh()
+
+
+class StressScenario:
+    """压力场景：后台线程以很高频率把设备列表变化和 UDID 结果投递给界面
+
+    app 需使用 FakeHdc 作为 hdc 后端，刷新和选择设备时不会访问真实设备。
+    """
+
+    def __init__(self, app, monitor, devices=300, seconds=20, budget_ms=50, rate=200):
+        self.app = app
+        self.monitor = monitor
+        self.serials = [f"FAKE{index:05d}" for index in range(devices)]
+        self.seconds = seconds
+        self.budget_ms = budget_ms
+        self.rate = rate  # 每秒投递的界面更新次数
+        self.passed = None
+        self._random = random.Random(0)
+
+    def start(self):
+        self.monitor.reset()
+        threading.Thread(target=self._drive, name="stress-driver", daemon=True).start()
+        self.app.after(self.seconds * 1000, self._finish)
+
+    def _drive(self):
+        deadline = time.monotonic() + self.seconds
+        interval = 1 / self.rate
+        updates = 0
+        while time.monotonic() < deadline:
+            updates += 1
+            if updates % 50 == 0:
+                # 模拟热插拔：随机一部分设备在线，并走完整的刷新流程
+                online = [serial for serial in self.serials if self._random.random() < 0.9]
+                self.app.after(0, self.app.update_device_list, online, f"模拟 {len(online)} 台设备在线")
+            elif updates % 10 == 0:
+                self.app.after(0, self.app.refresh_devices)
+            else:
+                serial = self._random.choice(self.serials)
+                self.app.after(0, self.app.update_udid_display, f"{serial}-{updates:08d}", "成功获取UDID")
+            time.sleep(interval)
+
+    def _finish(self):
+        p99 = self.monitor.percentile(99)
+        self.passed = p99 <= self.budget_ms
+        print(f"压力测试: {len(self.serials)} 台设备，{self.seconds}s，心跳 {self.monitor.samples} 次")
+        print(self.monitor.summary())
+        print(self.monitor.format_histogram())
+        print(f"结果: {'通过' if self.passed else '失败'}（p99 {p99}ms，预算 {self.budget_ms}ms）")
+        self.app.on_exit()